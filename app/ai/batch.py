@@ -0,0 +1,205 @@
+"""
+Генерация постов через OpenAI Batch API для больших очередей.
+
+submit_batch собирает JSONL с запросами к /v1/responses (custom_id — id поста), загружает файл,
+создает батч и переводит посты в статус batched. poll_batches опрашивает незавершенные батчи
+и, когда батч завершен, переносит результаты в posts пачками bulk UPDATE: успешные ответы —
+generated, ошибки запроса — failed, 429/5xx и запросы без результата возвращаются в new.
+
+Для проверки без OpenAI: python -m app.ai.batch_stub и OPENAI_BASE_URL=http://localhost:8090/v1.
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from openai import OpenAI
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+
+from app.ai.generator import INSTRUCTIONS, build_prompt
+from app.config import settings
+from app.database.models import GenerationBatch, NewsItem, Post
+from app.database.types import PostStatus
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT = '/v1/responses'
+TERMINAL_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+# Ошибки, после которых пост стоит сгенерировать заново, а не считать неудачным
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+APPLY_CHUNK_SIZE = 500
+
+
+def build_request(post: Post, news: NewsItem, temperature: float = 0.7, max_tokens: int = 500) -> dict:
+    return {
+        'custom_id': post.id,
+        'method': 'POST',
+        'url': ENDPOINT,
+        'body': {
+            'model': settings.OPENAI_MODEL,
+            'instructions': INSTRUCTIONS,
+            'input': build_prompt(news),
+            'temperature': temperature,
+            'max_output_tokens': max_tokens,
+        },
+    }
+
+
+def build_batch_file(posts: Sequence[Post], news_by_id: Dict[str, NewsItem]) -> bytes:
+    lines = (json.dumps(build_request(post, news_by_id[post.news_id]), ensure_ascii=False) for post in posts)
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def submit_batch(
+        session: Session,
+        client: OpenAI,
+        posts: Sequence[Post],
+        news_by_id: Dict[str, NewsItem]
+) -> GenerationBatch:
+    """Отправляет посты одним батчем; коммит за вызывающим"""
+    input_file = client.files.create(
+        file=(f'posts-{datetime.now():%Y%m%d%H%M%S}.jsonl', build_batch_file(posts, news_by_id)),
+        purpose='batch'
+    )
+    remote = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=ENDPOINT,
+        completion_window='24h',
+        metadata={'source': 'aibot', 'posts': str(len(posts))}
+    )
+
+    batch = GenerationBatch(
+        id=remote.id,
+        status=remote.status,
+        input_file_id=input_file.id,
+        post_count=len(posts)
+    )
+    session.add(batch)
+    session.execute(
+        update(Post)
+        .where(Post.id.in_([post.id for post in posts]))
+        .values(status=PostStatus.BATCHED, batch_id=batch.id),
+        execution_options={'synchronize_session': False}
+    )
+    logger.info(f'Создан батч генерации {batch.id}: {len(posts)} постов')
+    return batch
+
+
+def response_text(body: dict) -> Optional[str]:
+    """Аналог Response.output_text для тела ответа из файла результатов"""
+    texts = [
+        content.get('text') or ''
+        for item in body.get('output') or []
+        if item.get('type') == 'message'
+        for content in item.get('content') or []
+        if content.get('type') == 'output_text'
+    ]
+    return ''.join(texts) or None
+
+
+def _iter_file_lines(client: OpenAI, file_id: Optional[str]) -> Iterator[dict]:
+    if not file_id:
+        return
+    with client.files.with_streaming_response.content(file_id) as response:
+        for line in response.iter_lines():
+            if line.strip():
+                yield json.loads(line)
+
+
+def _result_values(line: dict) -> Optional[dict]:
+    """Новые значения поста по строке результата; None — пост вернется в очередь"""
+    response = line.get('response') or {}
+    status_code = response.get('status_code')
+    if not line.get('error') and status_code == 200:
+        text = response_text(response.get('body') or {})
+        if text:
+            return {'new_text': text, 'new_status': PostStatus.GENERATED}
+    elif status_code in RETRYABLE_STATUS_CODES:
+        return None
+    logger.warning(f'Batch API не сгенерировал пост {line.get("custom_id")}: {line.get("error") or response.get("body")}')
+    return {'new_text': None, 'new_status': PostStatus.FAILED}
+
+
+def apply_batch_results(session: Session, client: OpenAI, batch: GenerationBatch) -> List[str]:
+    """
+    Переносит результаты завершенного батча в posts, коммитя каждую пачку. Повторный запуск безопасен:
+    обновляются только посты этого батча в статусе batched. Возвращает id измененных постов.
+    """
+    posts = Post.__table__
+    # executemany по id: bulk UPDATE ORM требует весь первичный ключ, включая created_at
+    set_result = (
+        update(posts)
+        .where(posts.c.id == bindparam('row_id'))
+        .values(generated_text=bindparam('new_text'), status=bindparam('new_status'))
+    )
+    post_ids = []
+
+    def flush(rows: List[dict]):
+        current = set(session.scalars(
+            select(Post.id).where(
+                Post.id.in_([row['row_id'] for row in rows]),
+                Post.batch_id == batch.id,
+                Post.status == PostStatus.BATCHED
+            )
+        ))
+        rows = [row for row in rows if row['row_id'] in current]
+        if not rows:
+            return
+        session.execute(set_result, rows)
+        batch.generated_count += sum(1 for row in rows if row['new_status'] == PostStatus.GENERATED)
+        batch.failed_count += sum(1 for row in rows if row['new_status'] == PostStatus.FAILED)
+        session.commit()
+        post_ids.extend(row['row_id'] for row in rows)
+
+    rows = []
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        for line in _iter_file_lines(client, file_id):
+            values = _result_values(line)
+            if values is None:
+                continue
+            rows.append({'row_id': line['custom_id'], **values})
+            if len(rows) >= APPLY_CHUNK_SIZE:
+                flush(rows)
+                rows = []
+    if rows:
+        flush(rows)
+
+    # Запросы без результата (истекший или отмененный батч, повторяемые ошибки) снова ждут генерации
+    waiting = (Post.batch_id == batch.id) & (Post.status == PostStatus.BATCHED)
+    returned = list(session.scalars(select(Post.id).where(waiting)))
+    if returned:
+        session.execute(
+            update(Post).where(waiting).values(status=PostStatus.NEW),
+            execution_options={'synchronize_session': False}
+        )
+        post_ids.extend(returned)
+
+    batch.applied_at = datetime.now()
+    session.commit()
+    logger.info(
+        f'Батч {batch.id} ({batch.status}) применен: сгенерировано {batch.generated_count}, '
+        f'ошибок {batch.failed_count}, возвращено в очередь {len(returned)}'
+    )
+    return post_ids
+
+
+def poll_batches(session: Session, client: OpenAI) -> Tuple[Dict[str, int], List[str]]:
+    """Обновляет статусы незавершенных батчей и применяет завершенные; возвращает счетчики и id измененных постов"""
+    stats = {'pending': 0, 'applied': 0, 'generated': 0, 'failed': 0}
+    post_ids = []
+    for batch in session.scalars(select(GenerationBatch).where(GenerationBatch.applied_at.is_(None))).all():
+        remote = client.batches.retrieve(batch.id)
+        batch.status = remote.status
+        batch.output_file_id = remote.output_file_id
+        batch.error_file_id = remote.error_file_id
+        if remote.status not in TERMINAL_STATUSES:
+            stats['pending'] += 1
+            session.commit()
+            continue
+
+        post_ids += apply_batch_results(session, client, batch)
+        stats['applied'] += 1
+        stats['generated'] += batch.generated_count
+        stats['failed'] += batch.failed_count
+    return stats, post_ids
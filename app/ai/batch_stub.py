@@ -0,0 +1,184 @@
+"""
+Локальная заглушка OpenAI Files и Batch API для проверки пакетной генерации без OpenAI.
+
+Хранит файлы и батчи в памяти, на каждый запрос /v1/responses отвечает текстом из начала промпта.
+Батч завершается через --delay секунд после создания; запросы с текстом --fail-marker во входе
+попадают в файл ошибок.
+
+    python -m app.ai.batch_stub --port 8090 --delay 5
+    OPENAI_BASE_URL=http://localhost:8090/v1 OPENAI_API_KEY=stub
+"""
+import argparse
+import json
+import time
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from typing import Dict, Optional
+from uuid import uuid4
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response
+
+app = FastAPI(title='OpenAI Batch API stub')
+
+files: Dict[str, dict] = {}
+batches: Dict[str, dict] = {}
+options = {'delay': 0.0, 'fail_marker': None}
+
+
+def _file_object(file_id: str) -> dict:
+    stored = files[file_id]
+    return {
+        'id': file_id,
+        'object': 'file',
+        'bytes': len(stored['content']),
+        'created_at': stored['created_at'],
+        'filename': stored['filename'],
+        'purpose': stored['purpose'],
+        'status': 'processed',
+    }
+
+
+def _store_file(content: bytes, filename: str, purpose: str) -> str:
+    file_id = f'file-{uuid4().hex}'
+    files[file_id] = {'content': content, 'filename': filename, 'purpose': purpose, 'created_at': int(time.time())}
+    return file_id
+
+
+def _parse_multipart(content_type: str, body: bytes) -> Dict[str, tuple]:
+    """Поле формы -> (имя файла, содержимое); без python-multipart"""
+    message = BytesParser(policy=default_policy).parsebytes(
+        f'Content-Type: {content_type}\r\n\r\n'.encode() + body
+    )
+    return {
+        part.get_param('name', header='content-disposition'): (part.get_filename(), part.get_payload(decode=True))
+        for part in message.iter_parts()
+    }
+
+
+def _fake_response(request: dict) -> dict:
+    body = request.get('body') or {}
+    prompt = ' '.join(str(body.get('input', '')).split())
+    return {
+        'id': f'resp_{uuid4().hex}',
+        'object': 'response',
+        'status': 'completed',
+        'model': body.get('model'),
+        'output': [{
+            'type': 'message',
+            'role': 'assistant',
+            'content': [{'type': 'output_text', 'text': f'[stub] {prompt[:200]}'}],
+        }],
+        'usage': {'input_tokens': len(prompt) // 3, 'output_tokens': 20, 'total_tokens': len(prompt) // 3 + 20},
+    }
+
+
+def _complete(batch: dict) -> None:
+    output, errors = [], []
+    for line in files[batch['input_file_id']]['content'].decode().splitlines():
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        result = {'id': f'batch_req_{uuid4().hex}', 'custom_id': request['custom_id']}
+        if options['fail_marker'] and options['fail_marker'] in line:
+            errors.append({**result, 'response': {
+                'status_code': 400,
+                'request_id': uuid4().hex,
+                'body': {'error': {'message': 'stub failure', 'type': 'invalid_request_error'}},
+            }, 'error': None})
+        else:
+            output.append({**result, 'response': {
+                'status_code': 200, 'request_id': uuid4().hex, 'body': _fake_response(request)
+            }, 'error': None})
+
+    def to_file(lines) -> Optional[str]:
+        if not lines:
+            return None
+        content = ''.join(json.dumps(line, ensure_ascii=False) + '\n' for line in lines).encode()
+        return _store_file(content, f'{batch["id"]}_output.jsonl', 'batch_output')
+
+    batch.update(
+        status='completed',
+        completed_at=int(time.time()),
+        output_file_id=to_file(output),
+        error_file_id=to_file(errors),
+        request_counts={'total': len(output) + len(errors), 'completed': len(output), 'failed': len(errors)},
+    )
+
+
+@app.post('/v1/files')
+async def create_file(request: Request):
+    fields = _parse_multipart(request.headers.get('content-type', ''), await request.body())
+    if 'file' not in fields:
+        raise HTTPException(status_code=400, detail='file is required')
+    filename, content = fields['file']
+    purpose = (fields.get('purpose') or (None, b'batch'))[1].decode()
+    return _file_object(_store_file(content, filename or 'upload.jsonl', purpose))
+
+
+@app.get('/v1/files/{file_id}')
+async def retrieve_file(file_id: str):
+    if file_id not in files:
+        raise HTTPException(status_code=404, detail='file not found')
+    return _file_object(file_id)
+
+
+@app.get('/v1/files/{file_id}/content')
+async def file_content(file_id: str):
+    if file_id not in files:
+        raise HTTPException(status_code=404, detail='file not found')
+    return Response(files[file_id]['content'], media_type='application/jsonl')
+
+
+@app.post('/v1/batches')
+async def create_batch(request: Request):
+    params = await request.json()
+    if params.get('input_file_id') not in files:
+        raise HTTPException(status_code=400, detail='input file not found')
+    batch_id = f'batch_{uuid4().hex}'
+    batches[batch_id] = {
+        'id': batch_id,
+        'object': 'batch',
+        'endpoint': params['endpoint'],
+        'input_file_id': params['input_file_id'],
+        'completion_window': params.get('completion_window', '24h'),
+        'status': 'in_progress',
+        'created_at': int(time.time()),
+        'metadata': params.get('metadata'),
+        'output_file_id': None,
+        'error_file_id': None,
+    }
+    return batches[batch_id]
+
+
+@app.get('/v1/batches/{batch_id}')
+async def retrieve_batch(batch_id: str):
+    batch = batches.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail='batch not found')
+    if batch['status'] == 'in_progress' and time.time() - batch['created_at'] >= options['delay']:
+        _complete(batch)
+    return batch
+
+
+@app.post('/v1/batches/{batch_id}/cancel')
+async def cancel_batch(batch_id: str):
+    batch = batches.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail='batch not found')
+    if batch['status'] == 'in_progress':
+        batch.update(status='cancelled', cancelled_at=int(time.time()))
+    return batch
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Заглушка OpenAI Batch API')
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8090)
+    arg_parser.add_argument('--delay', type=float, default=0.0, help='через сколько секунд батч завершается')
+    arg_parser.add_argument('--fail-marker', default=None, help='запросы с этим текстом завершаются ошибкой')
+    args = arg_parser.parse_args()
+
+    options.update(delay=args.delay, fail_marker=args.fail_marker)
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,120 @@
+"""
+Кеш ответов модели в Redis, адресуемый содержимым запроса.
+
+Ключ llm:cache:{sha256} считается от (model, instructions, prompt, temperature, max_tokens), поэтому
+повторная задача или повторно загруженная новость с тем же текстом стоит одного GET вместо запроса к OpenAI.
+Записи живут LLM_CACHE_TTL_HOURS; ZSET llm:cache:lru хранит время последнего обращения, и при превышении
+LLM_CACHE_MAX_ENTRIES удаляются самые давно не читанные. Счетчики попаданий — в llm:cache:stats.
+Вызывающий может отключить кеш (use_cache=False), если нужен новый вариант текста.
+Ошибки Redis кеш просто пропускает.
+"""
+import hashlib
+import json
+import logging
+import time
+from typing import Dict, Optional
+
+from redis import Redis, RedisError
+from redis.asyncio import Redis as AsyncRedis
+
+from app.config import settings
+from app.redis_client import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'llm:cache:'
+LRU_KEY = 'llm:cache:lru'
+STATS_KEY = 'llm:cache:stats'
+
+
+def cache_key(model: str, instructions: str, prompt: str, temperature: float, max_tokens: int) -> str:
+    payload = json.dumps([model, instructions, prompt, temperature, max_tokens], ensure_ascii=False)
+    return KEY_PREFIX + hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _ttl() -> int:
+    return settings.LLM_CACHE_TTL_HOURS * 3600
+
+
+def _touch(pipeline, key: str, kind: str) -> None:
+    if kind == 'hit':
+        pipeline.zadd(LRU_KEY, {key: time.time()})
+    pipeline.hincrby(STATS_KEY, kind, 1)
+
+
+def _store(pipeline, key: str, text: str) -> None:
+    now = time.time()
+    pipeline.set(key, text.encode(), ex=_ttl())
+    pipeline.zadd(LRU_KEY, {key: now})
+    # Записи, истекшие по TTL, из индекса LRU тоже убираем
+    pipeline.zremrangebyscore(LRU_KEY, '-inf', now - _ttl())
+    pipeline.zcard(LRU_KEY)
+
+
+def _decode(value: Optional[bytes]) -> Optional[str]:
+    return value.decode() if value is not None else None
+
+
+def get_cached(redis: Redis, key: str) -> Optional[str]:
+    try:
+        value = redis.get(key)
+        pipeline = redis.pipeline(transaction=False)
+        _touch(pipeline, key, 'hit' if value is not None else 'miss')
+        pipeline.execute()
+    except RedisError as e:
+        logger.warning(f'Кеш ответов модели недоступен: {e}')
+        return None
+    return _decode(value)
+
+
+def store(redis: Redis, key: str, text: str) -> None:
+    try:
+        pipeline = redis.pipeline(transaction=False)
+        _store(pipeline, key, text)
+        size = pipeline.execute()[-1]
+        if size > settings.LLM_CACHE_MAX_ENTRIES:
+            evicted = [member for member, _ in redis.zpopmin(LRU_KEY, size - settings.LLM_CACHE_MAX_ENTRIES)]
+            if evicted:
+                redis.delete(*evicted)
+                redis.hincrby(STATS_KEY, 'evicted', len(evicted))
+    except RedisError as e:
+        logger.warning(f'Не удалось сохранить ответ модели в кеш: {e}')
+
+
+async def get_cached_async(redis: AsyncRedis, key: str) -> Optional[str]:
+    try:
+        value = await redis.get(key)
+        async with redis.pipeline(transaction=False) as pipeline:
+            _touch(pipeline, key, 'hit' if value is not None else 'miss')
+            await pipeline.execute()
+    except RedisError as e:
+        logger.warning(f'Кеш ответов модели недоступен: {e}')
+        return None
+    return _decode(value)
+
+
+async def store_async(redis: AsyncRedis, key: str, text: str) -> None:
+    try:
+        async with redis.pipeline(transaction=False) as pipeline:
+            _store(pipeline, key, text)
+            size = (await pipeline.execute())[-1]
+        if size > settings.LLM_CACHE_MAX_ENTRIES:
+            evicted = [member for member, _ in await redis.zpopmin(LRU_KEY, size - settings.LLM_CACHE_MAX_ENTRIES)]
+            if evicted:
+                await redis.delete(*evicted)
+                await redis.hincrby(STATS_KEY, 'evicted', len(evicted))
+    except RedisError as e:
+        logger.warning(f'Не удалось сохранить ответ модели в кеш: {e}')
+
+
+async def cache_stats() -> Dict[str, float]:
+    redis = get_async_redis()
+    try:
+        counters = await redis.hgetall(STATS_KEY)
+        size = await redis.zcard(LRU_KEY)
+    except RedisError as e:
+        return {'error': str(e)}
+
+    stats = {kind: int(counters.get(kind.encode(), 0)) for kind in ('hit', 'miss', 'evicted')}
+    total = stats['hit'] + stats['miss']
+    return {**stats, 'entries': size, 'hit_ratio': stats['hit'] / total if total else 0.0}
@@ -1,6 +1,13 @@
+import asyncio
 import logging
+from typing import List, Optional, Sequence, Union
 
-from app.ai.openai_client import make_request
+from redis.asyncio import Redis as AsyncRedis
+
+from app.ai.openai_client import make_async_client, make_request, make_request_async
+from app.ai.rate_limit import TokenBucketLimiter
+from app.ai.retry import AdaptiveConcurrency, RateLimited
+from app.config import settings
 from app.database import NewsItem
 
 logger = logging.getLogger(__name__)
@@ -12,18 +19,104 @@ INSTRUCTIONS = """
 
 # TODO: rewrite instructions
 
-def generate_posts(news: NewsItem) -> str | None:
-    prompt = f"""
+def build_prompt(news: NewsItem) -> str:
+    # Полный текст статьи, если его удалось загрузить, иначе анонс со страницы списка
+    content = news.raw_text[:settings.GENERATION_MAX_TEXT_LENGTH] if news.raw_text else news.summary
+    return f"""
     Новость: {news.title}
-    Содержание: {news.summary}
+    Содержание: {content}
     Источник: {news.source if news.source else 'unknown'}
     """
 
+
+def generate_posts(news: NewsItem) -> str | None:
     logger.info(f'Генерация поста для новости: {news.id}')
 
-    post_text = make_request(INSTRUCTIONS, prompt)
+    post_text = make_request(INSTRUCTIONS, build_prompt(news))
 
     if not post_text:
         logger.error(f'Не удалось сгенерировать пост для новости: {news.id}')
         return None
     return post_text
+
+
+class PostGenerator:
+    """
+    Генерация постов для задачи Celery: один event loop, клиент AsyncOpenAI и лимитер на весь запуск.
+    Число одновременных запросов начинается с GENERATION_CONCURRENCY и подстраивается по AIMD
+    (не больше GENERATION_MAX_CONCURRENCY), общий темп ограничен токен-бакетом в Redis
+    (OPENAI_RPM_LIMIT, OPENAI_TPM_LIMIT), общим для всех воркеров.
+    """
+
+    def __init__(self, concurrency: int = settings.GENERATION_CONCURRENCY):
+        self._loop = asyncio.new_event_loop()
+        self._concurrency = concurrency
+        self._client = None
+        self._redis = None
+        self._limiter = None
+        self._adaptive = None
+        try:
+            self._loop.run_until_complete(self._open())
+        except Exception:
+            self._loop.close()
+            raise
+
+    async def _open(self):
+        self._client = make_async_client()
+        self._redis = AsyncRedis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT
+        )
+        self._limiter = TokenBucketLimiter(self._redis)
+        self._adaptive = AdaptiveConcurrency(self._concurrency)
+
+    @property
+    def concurrency(self) -> int:
+        return int(self._adaptive.limit)
+
+    async def _generate_one(self, news: NewsItem) -> Optional[str]:
+        logger.info(f'Генерация поста для новости: {news.id}')
+        post_text = await make_request_async(
+            self._client,
+            INSTRUCTIONS,
+            build_prompt(news),
+            limiter=self._limiter,
+            concurrency=self._adaptive,
+            redis=self._redis
+        )
+        if not post_text:
+            logger.error(f'Не удалось сгенерировать пост для новости: {news.id}')
+        return post_text
+
+    async def _generate_many(self, news_items: Sequence[NewsItem]) -> List[Union[str, None, RateLimited]]:
+        results = await asyncio.gather(*(self._generate_one(news) for news in news_items), return_exceptions=True)
+        texts = []
+        for news, result in zip(news_items, results):
+            if isinstance(result, RateLimited):
+                logger.warning(f'Генерация поста для новости {news.id} отложена: лимит OpenAI')
+            elif isinstance(result, Exception):
+                logger.error(f'Ошибка при генерации поста для новости {news.id}: {result}')
+                result = None
+            texts.append(result)
+        return texts
+
+    def generate(self, news_items: Sequence[NewsItem]) -> List[Union[str, None, RateLimited]]:
+        """Тексты постов в порядке news_items; None — генерация не удалась, RateLimited — стоит повторить позже"""
+        return self._loop.run_until_complete(self._generate_many(news_items))
+
+    async def _close(self):
+        await self._client.close()
+        await self._redis.aclose()
+
+    def close(self):
+        try:
+            self._loop.run_until_complete(self._close())
+        finally:
+            self._loop.close()
+
+    def __enter__(self) -> 'PostGenerator':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,36 +1,169 @@
+import asyncio
 import logging
+import time
+from contextlib import asynccontextmanager
 
-from openai import OpenAI, RateLimitError, OpenAIError
+from openai import AsyncOpenAI, OpenAI, RateLimitError, OpenAIError
+from redis.asyncio import Redis as AsyncRedis
 
+from app.ai.cache import cache_key, get_cached, get_cached_async, store, store_async
+from app.ai.rate_limit import TokenBucketLimiter, estimate_tokens
+from app.ai.retry import AdaptiveConcurrency, RateLimited, is_retryable, retry_delay
 from app.config import settings
+from app.redis_client import get_redis
 
 logger = logging.getLogger(__name__)
 
-client: OpenAI | None = OpenAI(api_key=settings.OPENAI_API_KEY) if settings.OPENAI_API_KEY else None
+# Повторы делаем сами (retry.py), встроенные повторы SDK их бы умножали
+client: OpenAI | None = OpenAI(
+    api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL, max_retries=0
+) if settings.OPENAI_API_KEY else None
 
 
-def make_request(instructions: str, prompt: str, temperature: float = 0.7, max_tokens: int = 500) -> str | None:
+def _next_delay(error: OpenAIError, attempt: int) -> float | None:
+    """Сколько ждать перед следующей попыткой; None — больше не повторяем"""
+    if not is_retryable(error) or attempt >= settings.OPENAI_MAX_RETRIES:
+        return None
+    delay = retry_delay(error, attempt)
+    if delay > settings.OPENAI_RETRY_MAX_DELAY:
+        return None
+    return delay
+
+
+def make_request(
+        instructions: str,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 500,
+        use_cache: bool = True
+) -> str | None:
     if not client:
         raise ValueError("OPENAI_API_KEY is not set")
     if not settings.OPENAI_MODEL:
         raise ValueError("OPENAI_MODEL is not set")
-    try:
-        response = client.responses.create(
-            model=settings.OPENAI_MODEL,
-            instructions=instructions,
-            input=prompt,
-            temperature=temperature,
-            max_output_tokens=max_tokens
-        )
-
-    except RateLimitError as e:
-        logger.error(f"Rate limit error: {e}")
-        return None
-    except OpenAIError as e:
-        logger.error(f"OpenAI error: {e}")
-        return None
-    except Exception as e:
-        logger.error(f"Error: {e}")
-        return None
 
-    return response.output_text
+    key = None
+    if use_cache and settings.LLM_CACHE_ENABLED:
+        key = cache_key(settings.OPENAI_MODEL, instructions, prompt, temperature, max_tokens)
+        cached = get_cached(get_redis(), key)
+        if cached is not None:
+            return cached
+
+    attempt = 0
+    while True:
+        try:
+            response = client.responses.create(
+                model=settings.OPENAI_MODEL,
+                instructions=instructions,
+                input=prompt,
+                temperature=temperature,
+                max_output_tokens=max_tokens
+            )
+            if key is not None and response.output_text:
+                store(get_redis(), key, response.output_text)
+            return response.output_text
+
+        except OpenAIError as e:
+            delay = _next_delay(e, attempt)
+            if delay is None:
+                logger.error(f"{'Rate limit' if isinstance(e, RateLimitError) else 'OpenAI'} error: {e}")
+                return None
+            logger.warning(f"OpenAI error, повтор {attempt + 1} через {delay:.1f} с: {e}")
+            time.sleep(delay)
+            attempt += 1
+        except Exception as e:
+            logger.error(f"Error: {e}")
+            return None
+
+
+def make_async_client() -> AsyncOpenAI:
+    """Асинхронный клиент привязан к event loop, поэтому создается на каждый запуск генерации"""
+    if not settings.OPENAI_API_KEY:
+        raise ValueError("OPENAI_API_KEY is not set")
+    return AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL, max_retries=0)
+
+
+@asynccontextmanager
+async def _attempt_slot(concurrency: AdaptiveConcurrency | None):
+    if concurrency is None:
+        yield time.monotonic()
+        return
+    async with concurrency.slot() as started_at:
+        yield started_at
+
+
+async def make_request_async(
+        async_client: AsyncOpenAI,
+        instructions: str,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 500,
+        limiter: TokenBucketLimiter | None = None,
+        concurrency: AdaptiveConcurrency | None = None,
+        redis: AsyncRedis | None = None,
+        use_cache: bool = True
+) -> str | None:
+    """
+    Текст ответа или None при ошибке. Если OpenAI продолжает отвечать 429 после всех повторов,
+    поднимает RateLimited: запрос стоит повторить позже, а не считать неудачным.
+    С redis ответы кешируются (app.ai.cache): попадание не расходует лимиты и место в параллелизме.
+    """
+    if not settings.OPENAI_MODEL:
+        raise ValueError("OPENAI_MODEL is not set")
+
+    key = None
+    if redis is not None and use_cache and settings.LLM_CACHE_ENABLED:
+        key = cache_key(settings.OPENAI_MODEL, instructions, prompt, temperature, max_tokens)
+        cached = await get_cached_async(redis, key)
+        if cached is not None:
+            return cached
+
+    estimated = estimate_tokens(instructions, prompt, max_tokens)
+    attempt = 0
+    while True:
+        # Место занимается только на время самой попытки, ожидание перед повтором его не держит
+        async with _attempt_slot(concurrency) as started_at:
+            if limiter is not None:
+                await limiter.acquire(estimated)
+
+            used = None
+            error = None
+            try:
+                response = await async_client.responses.create(
+                    model=settings.OPENAI_MODEL,
+                    instructions=instructions,
+                    input=prompt,
+                    temperature=temperature,
+                    max_output_tokens=max_tokens
+                )
+                used = response.usage.total_tokens if response.usage else None
+            except OpenAIError as e:
+                error = e
+            except Exception as e:
+                logger.error(f"Error: {e}")
+                return None
+            finally:
+                if limiter is not None:
+                    await limiter.settle(estimated, used)
+
+        if error is None:
+            if concurrency is not None:
+                concurrency.on_success()
+            if key is not None and response.output_text:
+                await store_async(redis, key, response.output_text)
+            return response.output_text
+
+        if isinstance(error, RateLimitError) and concurrency is not None:
+            concurrency.on_rate_limited(started_at)
+
+        delay = _next_delay(error, attempt)
+        if delay is None:
+            if isinstance(error, RateLimitError):
+                logger.error(f"Rate limit error: {error}")
+                raise RateLimited(str(error)) from error
+            logger.error(f"OpenAI error: {error}")
+            return None
+
+        logger.warning(f"OpenAI error, повтор {attempt + 1} через {delay:.1f} с: {error}")
+        await asyncio.sleep(delay)
+        attempt += 1
@@ -0,0 +1,118 @@
+"""
+Общий для всех воркеров лимит запросов к OpenAI: два токен-бакета в Redis (запросы в минуту
+и токены в минуту), которые проверяются и списываются одним Lua-скриптом атомарно.
+
+Перед запросом списывается оценка токенов (вход + max_output_tokens, как считает сам OpenAI),
+после ответа разница с фактическим расходом возвращается в бакет.
+"""
+import asyncio
+import logging
+from typing import Optional
+
+from redis import RedisError
+from redis.asyncio import Redis as AsyncRedis
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+REQUESTS_KEY = 'openai:ratelimit:requests'
+TOKENS_KEY = 'openai:ratelimit:tokens'
+# Емкость бакета — лимит за столько секунд: не даем выбрать минутный лимит одним залпом
+BURST_SECONDS = 10
+MAX_WAIT_SECONDS = 30
+# Грубая оценка для кириллицы и латиницы; точный расход приходит в usage ответа
+CHARS_PER_TOKEN = 3
+
+# KEYS: бакет запросов, бакет токенов
+# ARGV: лимит запросов в минуту, лимит токенов в минуту, запросов к списанию, токенов к списанию
+# Возвращает 0, если списано, иначе сколько миллисекунд подождать. Лимит 0 — без ограничения.
+ACQUIRE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local burst = tonumber(ARGV[5])
+
+local function refill(key, per_minute)
+    local capacity = math.max(1, per_minute * burst / 60)
+    local state = redis.call('HMGET', key, 'level', 'ts')
+    local level = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    return math.min(capacity, level + (now - ts) * per_minute / 60), capacity
+end
+
+local wait = 0
+local levels = {}
+for i = 1, 2 do
+    local per_minute = tonumber(ARGV[i])
+    if per_minute > 0 then
+        local level, capacity = refill(KEYS[i], per_minute)
+        local cost = math.min(tonumber(ARGV[i + 2]), capacity)
+        levels[i] = {level, cost}
+        if level < cost then
+            wait = math.max(wait, (cost - level) * 60 / per_minute)
+        end
+    end
+end
+
+if wait > 0 then
+    return math.max(1, math.ceil(wait * 1000))
+end
+for i, state in pairs(levels) do
+    redis.call('HSET', KEYS[i], 'level', state[1] - state[2], 'ts', now)
+    redis.call('EXPIRE', KEYS[i], 120)
+end
+return 0
+"""
+
+# Корректировка бакета токенов на разницу между оценкой и фактическим расходом
+ADJUST_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HINCRBYFLOAT', KEYS[1], 'level', ARGV[1])
+end
+return 0
+"""
+
+
+def estimate_tokens(instructions: str, prompt: str, max_tokens: int) -> int:
+    return (len(instructions) + len(prompt)) // CHARS_PER_TOKEN + max_tokens
+
+
+class TokenBucketLimiter:
+    def __init__(
+            self,
+            redis: AsyncRedis,
+            rpm: int = settings.OPENAI_RPM_LIMIT,
+            tpm: int = settings.OPENAI_TPM_LIMIT
+    ):
+        self.redis = redis
+        self.rpm = rpm
+        self.tpm = tpm
+        self._acquire = redis.register_script(ACQUIRE_SCRIPT)
+        self._adjust = redis.register_script(ADJUST_SCRIPT)
+        self._available = True
+
+    async def acquire(self, tokens: int) -> None:
+        """Ждет, пока в обоих бакетах хватит места; без Redis пропускает запрос, чтобы не остановить генерацию"""
+        if not self._available or (not self.rpm and not self.tpm):
+            return
+        while True:
+            try:
+                wait_ms = await self._acquire(
+                    keys=[REQUESTS_KEY, TOKENS_KEY],
+                    args=[self.rpm, self.tpm, 1, tokens, BURST_SECONDS]
+                )
+            except RedisError as e:
+                logger.warning(f'Лимитер OpenAI недоступен, запросы идут без ограничения: {e}')
+                self._available = False
+                return
+            if not wait_ms:
+                return
+            await asyncio.sleep(min(wait_ms / 1000, MAX_WAIT_SECONDS))
+
+    async def settle(self, estimated: int, used: Optional[int]) -> None:
+        if used is None or not self._available or not self.tpm or used == estimated:
+            return
+        try:
+            await self._adjust(keys=[TOKENS_KEY], args=[estimated - used])
+        except RedisError as e:
+            logger.warning(f'Не удалось скорректировать лимит токенов OpenAI: {e}')
@@ -0,0 +1,128 @@
+"""
+Повторы запросов к OpenAI и адаптивный параллелизм.
+
+Задержка перед повтором берется из ответа (retry-after-ms, retry-after, x-ratelimit-reset-*),
+а если сервер ее не прислал — экспоненциальная с полным джиттером. Параллелизм регулируется по AIMD:
+после 429 лимит одновременных запросов делится пополам, после каждого успеха растет на 1/лимит
+(примерно +1 за «окно» запросов), так что генерация сама держится у предела аккаунта.
+"""
+import asyncio
+import random
+import re
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from time import monotonic
+from typing import Mapping, Optional
+
+from openai import APIConnectionError, APITimeoutError, InternalServerError, OpenAIError, RateLimitError
+
+from app.config import settings
+
+DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+RESET_HEADERS = (
+    ('x-ratelimit-remaining-requests', 'x-ratelimit-reset-requests'),
+    ('x-ratelimit-remaining-tokens', 'x-ratelimit-reset-tokens'),
+)
+
+
+class RateLimited(Exception):
+    """OpenAI отвечает 429 дольше, чем мы готовы ждать в рамках задачи: пост стоит повторить позже"""
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, RateLimitError):
+        # Закончившуюся квоту повторами не исправить
+        return getattr(error, 'code', None) != 'insufficient_quota'
+    return isinstance(error, (APIConnectionError, APITimeoutError, InternalServerError))
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    """Формат x-ratelimit-reset-*: 20ms, 1s, 6m0s, 1h2m3.5s"""
+    parts = DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * DURATION_UNITS[unit] for number, unit in parts)
+
+
+def server_delay(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            try:
+                return max(0.0, (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+
+    # Ждем сброса того лимита, который исчерпан
+    delays = []
+    for remaining_header, reset_header in RESET_HEADERS:
+        reset = headers.get(reset_header)
+        if reset and headers.get(remaining_header) == '0':
+            delay = _parse_duration(reset)
+            if delay is not None:
+                delays.append(delay)
+    return max(delays) if delays else None
+
+
+def retry_delay(error: OpenAIError, attempt: int) -> float:
+    """Задержка перед попыткой attempt + 1 (attempt считается с нуля)"""
+    response = getattr(error, 'response', None)
+    delay = server_delay(response.headers if response is not None else None)
+    if delay is not None:
+        # Небольшой джиттер, чтобы воркеры не вернулись все в одну миллисекунду
+        return delay * random.uniform(1.0, 1.1)
+    return random.uniform(0, min(settings.OPENAI_RETRY_MAX_DELAY, settings.OPENAI_RETRY_BASE_DELAY * 2 ** attempt))
+
+
+class AdaptiveConcurrency:
+    """Ограничитель одновременных запросов с лимитом, меняющимся по AIMD"""
+
+    def __init__(
+            self,
+            initial: int = settings.GENERATION_CONCURRENCY,
+            minimum: int = 1,
+            maximum: int = settings.GENERATION_MAX_CONCURRENCY
+    ):
+        self.minimum = minimum
+        self.maximum = max(maximum, initial)
+        self.limit = float(initial)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Занимает место на время одной попытки; отдает время ее начала для on_rate_limited"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        try:
+            yield monotonic()
+        finally:
+            async with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def on_success(self):
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_rate_limited(self, started_at: float):
+        # Несколько 429 из одного залпа — один сигнал: уменьшаем только по запросам, начатым после прошлого снижения
+        if started_at < self._last_decrease:
+            return
+        self.limit = max(self.minimum, self.limit / 2)
+        self._last_decrease = monotonic()
@@ -0,0 +1,130 @@
+"""
+Кеш ответов GET-эндпоинтов в Redis (read-through) с ETag.
+
+Ответ по id хранится под api:{resource}:item:{id} и удаляется при изменении объекта.
+Страницы списков хранятся под поколением ресурса api:{resource}:list:{gen}:...: любое изменение
+увеличивает поколение, и все страницы разом перестают находиться (старые истекают по TTL).
+Если Redis недоступен, ответ просто строится из БД.
+"""
+import hashlib
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+from redis import RedisError
+from starlette.status import HTTP_304_NOT_MODIFIED
+
+from app.config import settings
+from app.redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = 'api:cache:stats'
+
+Loader = Callable[[], Awaitable[Tuple[Any, Dict[str, str]]]]
+
+
+def item_key(resource: str, id: str) -> str:
+    return f'api:{resource}:item:{id}'
+
+
+def _generation_key(resource: str) -> str:
+    return f'api:{resource}:gen'
+
+
+def _etag(body: str) -> str:
+    return '"' + hashlib.blake2b(body.encode('utf-8'), digest_size=16).hexdigest() + '"'
+
+
+async def list_key(resource: str, request: Request) -> str:
+    generation = int(await get_async_redis().get(_generation_key(resource)) or 0)
+    params = hashlib.blake2b(
+        json.dumps(sorted(request.query_params.multi_items())).encode('utf-8'),
+        digest_size=16
+    ).hexdigest()
+    return f'api:{resource}:list:{generation}:{params}'
+
+
+async def cached_response(
+        request: Request,
+        resource: str,
+        key: Optional[str],
+        loader: Loader,
+        ttl: int
+) -> Response:
+    """
+    Отдает закешированный JSON или строит его через loader (возвращает тело и заголовки)
+    и кладет в кеш. Совпавший If-None-Match получает 304 без тела.
+    key=None — строить ключ списка по параметрам запроса.
+    """
+    entry = None
+    redis = get_async_redis() if settings.API_CACHE_ENABLED else None
+    if redis is not None:
+        try:
+            key = key or await list_key(resource, request)
+            raw = await redis.get(key)
+            entry = json.loads(raw) if raw else None
+            await redis.hincrby(STATS_KEY, f'{resource}:{"hit" if entry else "miss"}', 1)
+        except RedisError as e:
+            logger.warning(f'Кеш API недоступен: {e}')
+            redis = None
+
+    if entry is None:
+        content, headers = await loader()
+        body = json.dumps(content, ensure_ascii=False)
+        entry = {'body': body, 'etag': _etag(body), 'headers': headers}
+        if redis is not None:
+            try:
+                await redis.set(key, json.dumps(entry), ex=ttl)
+            except RedisError as e:
+                logger.warning(f'Не удалось сохранить ответ в кеш API: {e}')
+
+    headers = {'ETag': entry['etag'], 'Cache-Control': 'no-cache', **entry['headers']}
+    if entry['etag'] in request.headers.get('If-None-Match', ''):
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry['body'], media_type='application/json', headers=headers)
+
+
+async def invalidate_async(resource: str, ids: Iterable[str] = ()) -> None:
+    if not settings.API_CACHE_ENABLED:
+        return
+    redis = get_async_redis()
+    try:
+        async with redis.pipeline(transaction=False) as pipeline:
+            for id in ids:
+                pipeline.delete(item_key(resource, id))
+            pipeline.incr(_generation_key(resource))
+            await pipeline.execute()
+    except RedisError as e:
+        logger.warning(f'Не удалось сбросить кеш API {resource}: {e}')
+
+
+def invalidate(resource: str, ids: Iterable[str] = ()) -> None:
+    """Синхронный вариант для задач Celery"""
+    if not settings.API_CACHE_ENABLED:
+        return
+    try:
+        pipeline = get_redis().pipeline(transaction=False)
+        for id in ids:
+            pipeline.delete(item_key(resource, id))
+        pipeline.incr(_generation_key(resource))
+        pipeline.execute()
+    except RedisError as e:
+        logger.warning(f'Не удалось сбросить кеш API {resource}: {e}')
+
+
+async def cache_stats() -> Dict[str, dict]:
+    try:
+        counters = await get_async_redis().hgetall(STATS_KEY)
+    except RedisError as e:
+        return {'error': str(e)}
+
+    result: Dict[str, dict] = {}
+    for field, value in counters.items():
+        resource, kind = field.decode().rsplit(':', 1)
+        result.setdefault(resource, {'hit': 0, 'miss': 0})[kind] = int(value)
+    for stats in result.values():
+        total = stats['hit'] + stats['miss']
+        stats['hit_ratio'] = stats['hit'] / total if total else 0.0
+    return result
@@ -1,21 +1,38 @@
 import logging
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from redis import RedisError
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.exceptions import HTTPException
-from starlette.status import HTTP_404_NOT_FOUND, HTTP_204_NO_CONTENT
+from starlette.status import HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND, HTTP_204_NO_CONTENT
 
 from app.api.schemas import (
     SourceResponse, 
     SourceCreate, 
     SourceUpdate, 
     PostResponse,
+    KeywordCreate,
+    KeywordResponse,
+    NewsItemResponse,
+    NewsSearchResult,
     TelegramAuthRequest,
-    TelegramAuthResponse
+    TelegramAuthResponse,
+    validate_parser_selectors
 )
-from app.database import get_db, Source, Post
+from app.ai.cache import cache_stats as llm_cache_stats
+from app.api.cache import cache_stats, cached_response, invalidate_async, item_key
+from app.api.export import MEDIA_TYPES, ExportEntity, ExportFormat, build_export_query, stream_export
+from app.api.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_token, encode_token, page, paginate
+from app.config import settings
+from app.database import get_db, Keyword, NewsItem, Source, Post, PostStatus, SourceType
+from app.database.db import pool_stats
+from app.database.search import SearchSort, search_news_query
+from app.keyword_filter import VERSION_KEY as KEYWORDS_VERSION_KEY
+from app.redis_client import get_async_redis
 from app.tasks import publish_posts_task, parse_news
 from app.telegram.bot import authorize_telegram, get_telegram_client
 
@@ -26,24 +43,41 @@ router = APIRouter(prefix='/api', tags=['api'])
 
 @router.get('/sources/', response_model=List[SourceResponse])
 async def get_sources(
-        offset: int = 0,
-        limit: int = 20,
+        request: Request,
+        cursor: Optional[str] = None,
+        limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+        type: Optional[SourceType] = None,
+        enabled: Optional[bool] = None,
         db: AsyncSession = Depends(get_db)
 ):
-    result = await db.execute(select(Source).offset(offset).limit(limit))
-    sources = result.scalars().all()
-    return sources
+    async def load():
+        query = select(Source)
+        if type is not None:
+            query = query.where(Source.type == type)
+        if enabled is not None:
+            query = query.where(Source.enabled == enabled)
+        result = await db.execute(paginate(query, Source, cursor, limit))
+        sources, headers = page(result.scalars().all(), limit)
+        return [SourceResponse.model_validate(source).model_dump(mode='json') for source in sources], headers
+
+    return await cached_response(request, 'sources', None, load, settings.API_CACHE_LIST_TTL)
 
 
 @router.get('/sources/{source_id}', response_model=SourceResponse)
 async def get_source(
+        request: Request,
         source_id: str,
         db: AsyncSession = Depends(get_db)
 ):
-    source = await db.get(Source, source_id)
-    if not source:
-        raise HTTPException(HTTP_404_NOT_FOUND, 'Источник с данным id не найден')
-    return source
+    async def load():
+        source = await db.get(Source, source_id)
+        if not source:
+            raise HTTPException(HTTP_404_NOT_FOUND, 'Источник с данным id не найден')
+        return SourceResponse.model_validate(source).model_dump(mode='json'), {}
+
+    return await cached_response(
+        request, 'sources', item_key('sources', source_id), load, settings.API_CACHE_ITEM_TTL
+    )
 
 
 @router.post('/sources/', status_code=201, response_model=SourceResponse)
@@ -55,6 +89,7 @@ async def create_resource(
     db.add(source)
     await db.commit()
     await db.refresh(source)
+    await invalidate_async('sources')
     return source
 
 
@@ -69,11 +104,19 @@ async def update_source(
         raise HTTPException(HTTP_404_NOT_FOUND, 'Источник с данным id не найден')
 
     source_data = source_data.model_dump(exclude_unset=True)
+    try:
+        validate_parser_selectors(
+            source_data.get('parser', source.parser),
+            source_data.get('selectors', source.selectors)
+        )
+    except ValueError as e:
+        raise HTTPException(HTTP_400_BAD_REQUEST, str(e))
     for key, value in source_data.items():
         setattr(source, key, value)
 
     await db.commit()
     await db.refresh(source)
+    await invalidate_async('sources', [source_id])
     return source
 
 
@@ -87,28 +130,71 @@ async def delete_source(
         raise HTTPException(HTTP_404_NOT_FOUND, 'Источник с данным id не найден')
     await db.delete(source)
     await db.commit()
+    await invalidate_async('sources', [source_id])
 
 
 @router.get('/posts/', response_model=List[PostResponse])
 async def get_posts(
-        offset: int = 0,
-        limit: int = 20,
+        request: Request,
+        cursor: Optional[str] = None,
+        limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+        status: Optional[PostStatus] = None,
+        source: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
         db: AsyncSession = Depends(get_db)
 ):
-    result = await db.execute(select(Post).offset(offset).limit(limit))
-    posts = result.scalars().all()
-    return posts
+    """Посты от новых к старым; следующая страница — по курсору из заголовка X-Next-Cursor"""
+    async def load():
+        query = select(Post)
+        if status is not None:
+            query = query.where(Post.status == status)
+        if source is not None:
+            query = query.join(NewsItem, NewsItem.id == Post.news_id).where(NewsItem.source == source)
+        if created_from is not None:
+            query = query.where(Post.created_at >= created_from)
+        if created_to is not None:
+            query = query.where(Post.created_at < created_to)
+        result = await db.execute(paginate(query, Post, cursor, limit))
+        posts, headers = page(result.scalars().all(), limit)
+        return [PostResponse.model_validate(post).model_dump(mode='json') for post in posts], headers
+
+    return await cached_response(request, 'posts', None, load, settings.API_CACHE_LIST_TTL)
 
 
 @router.get('/posts/{post_id}', response_model=PostResponse)
 async def get_post(
+        request: Request,
         post_id: str,
         db: AsyncSession = Depends(get_db)
 ):
-    post = await db.get(Post, post_id)
-    if not post:
-        raise HTTPException(HTTP_404_NOT_FOUND, 'Пост с данным id не найден')
-    return post
+    async def load():
+        post = await db.get(Post, post_id)
+        if not post:
+            raise HTTPException(HTTP_404_NOT_FOUND, 'Пост с данным id не найден')
+        return PostResponse.model_validate(post).model_dump(mode='json'), {}
+
+    return await cached_response(request, 'posts', item_key('posts', post_id), load, settings.API_CACHE_ITEM_TTL)
+
+
+@router.get('/export/{entity}')
+async def export(
+        entity: ExportEntity,
+        format: ExportFormat = ExportFormat.NDJSON,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        status: Optional[PostStatus] = None,
+        source: Optional[str] = None,
+        include_text: bool = False
+):
+    """Потоковая выгрузка news или posts; status — только для постов, source и include_text — для новостей"""
+    query = build_export_query(entity, created_from, created_to, status, source, include_text)
+    filename = f'{entity.value}.{format.value}'
+    return StreamingResponse(
+        stream_export(query, format),
+        media_type=MEDIA_TYPES[format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
 
 
 @router.post('/publish-posts/', status_code=200)
@@ -123,6 +209,12 @@ async def parse_sources():
     return {'status': 'started'}
 
 
+@router.get('/metrics/')
+async def get_metrics():
+    """Метрики процесса API: ожидание соединений из пулов БД; попадания в кеши API и модели — общие для всех процессов"""
+    return {'db_pools': pool_stats(), 'api_cache': await cache_stats(), 'llm_cache': await llm_cache_stats()}
+
+
 @router.post('/telegram/authorize/', response_model=TelegramAuthResponse)
 async def authorize_telegram_endpoint(request: TelegramAuthRequest):
     """
@@ -130,11 +222,13 @@ async def authorize_telegram_endpoint(request: TelegramAuthRequest):
     1. Первый запрос: отправьте только phone - получите код в Telegram
     2. Второй запрос: отправьте phone и code - авторизуетесь
     3. Если требуется 2FA: отправьте phone, code и password
+    С reader=true авторизуется отдельная сессия парсера Telegram-каналов.
     """
     result = await authorize_telegram(
         phone=request.phone,
         code=request.code,
-        password=request.password
+        password=request.password,
+        session_name=settings.TELERGAM_READER_SESSION_NAME if request.reader else settings.TELERGAM_SESSION_NAME
     )
     return TelegramAuthResponse(**result)
 
@@ -181,5 +275,129 @@ async def get_telegram_status():
     finally:
         await client.disconnect()
 
-# TODO: CRUD for keywords
-# TODO: list and retrieve for news
\ No newline at end of file
+@router.get('/keywords/', response_model=List[KeywordResponse])
+async def get_keywords(db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(Keyword).order_by(Keyword.word))
+    return result.scalars().all()
+
+
+@router.post('/keywords/', status_code=201, response_model=KeywordResponse)
+async def create_keyword(
+        keyword_data: KeywordCreate,
+        db: AsyncSession = Depends(get_db)
+):
+    keyword = Keyword(word=keyword_data.word.strip())
+    db.add(keyword)
+    await db.commit()
+    await db.refresh(keyword)
+    await bump_keywords_version()
+    return keyword
+
+
+@router.put('/keywords/{keyword_id}', response_model=KeywordResponse)
+async def update_keyword(
+        keyword_id: str,
+        keyword_data: KeywordCreate,
+        db: AsyncSession = Depends(get_db)
+):
+    keyword = await db.get(Keyword, keyword_id)
+    if not keyword:
+        raise HTTPException(HTTP_404_NOT_FOUND, 'Ключевое слово с данным id не найдено')
+    keyword.word = keyword_data.word.strip()
+    await db.commit()
+    await db.refresh(keyword)
+    await bump_keywords_version()
+    return keyword
+
+
+@router.delete('/keywords/{keyword_id}', status_code=HTTP_204_NO_CONTENT)
+async def delete_keyword(
+        keyword_id: str,
+        db: AsyncSession = Depends(get_db)
+):
+    keyword = await db.get(Keyword, keyword_id)
+    if not keyword:
+        raise HTTPException(HTTP_404_NOT_FOUND, 'Ключевое слово с данным id не найдено')
+    await db.delete(keyword)
+    await db.commit()
+    await bump_keywords_version()
+
+
+async def bump_keywords_version():
+    """Воркеры пересоберут фильтр ключевых слов при следующей генерации"""
+    try:
+        await get_async_redis().incr(KEYWORDS_VERSION_KEY)
+    except RedisError as e:
+        logger.warning(f'Не удалось обновить версию ключевых слов: {e}')
+
+
+@router.get('/news/', response_model=List[NewsItemResponse])
+async def get_news(
+        response: Response,
+        cursor: Optional[str] = None,
+        limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+        source: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        db: AsyncSession = Depends(get_db)
+):
+    query = select(NewsItem)
+    if source is not None:
+        query = query.where(NewsItem.source == source)
+    if created_from is not None:
+        query = query.where(NewsItem.created_at >= created_from)
+    if created_to is not None:
+        query = query.where(NewsItem.created_at < created_to)
+    result = await db.execute(paginate(query, NewsItem, cursor, limit))
+    news, headers = page(result.scalars().all(), limit)
+    response.headers.update(headers)
+    return news
+
+
+@router.get('/news/search', response_model=List[NewsSearchResult])
+async def search_news(
+        response: Response,
+        q: str = Query(..., min_length=1, max_length=200),
+        sort: SearchSort = SearchSort.RANK,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Полнотекстовый поиск по заголовку, анонсу и тексту новостей: по релевантности (sort=rank)
+    или от новых к старым (sort=date). Следующая страница — по курсору из заголовка X-Next-Cursor
+    """
+    after = None
+    if cursor:
+        try:
+            cursor_sort, value, id = decode_token(cursor)
+            if cursor_sort != sort.value:
+                raise ValueError
+            after = (float(value) if sort == SearchSort.RANK else datetime.fromisoformat(value), str(id))
+        except (ValueError, TypeError):
+            raise HTTPException(HTTP_400_BAD_REQUEST, 'Некорректный курсор')
+
+    query = search_news_query(db.bind.dialect.name, q, sort, created_from, created_to, after, limit)
+    rows = (await db.execute(query)).all()
+    results = [
+        NewsSearchResult(**NewsItemResponse.model_validate(news).model_dump(), rank=score)
+        for news, score in rows[:limit]
+    ]
+    if len(rows) > limit:
+        last_news, last_score = rows[limit - 1]
+        value = last_score if sort == SearchSort.RANK else last_news.created_at.isoformat()
+        response.headers[NEXT_CURSOR_HEADER] = encode_token([sort.value, value, last_news.id])
+    return results
+
+
+@router.get('/news/{news_id}', response_model=NewsItemResponse)
+async def get_news_item(
+        news_id: str,
+        db: AsyncSession = Depends(get_db)
+):
+    news = await db.get(NewsItem, news_id)
+    if not news:
+        raise HTTPException(HTTP_404_NOT_FOUND, 'Новость с данным id не найдена')
+    return news
\ No newline at end of file
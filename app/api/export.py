@@ -0,0 +1,104 @@
+"""
+Потоковая выгрузка новостей и постов в NDJSON/CSV.
+Строки читаются курсором на стороне сервера (stream + yield_per) без ORM-объектов
+и отдаются кусками, так что память процесса API не зависит от размера выгрузки.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any, AsyncIterator, Optional
+
+from sqlalchemy import Select, select
+
+from app.database.db import async_session_factory
+from app.database.models import NewsItem, Post
+from app.database.types import PostStatus
+
+EXPORT_BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+
+
+class ExportFormat(str, Enum):
+    NDJSON = 'ndjson'
+    CSV = 'csv'
+
+
+class ExportEntity(str, Enum):
+    NEWS = 'news'
+    POSTS = 'posts'
+
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: 'application/x-ndjson',
+    ExportFormat.CSV: 'text/csv; charset=utf-8',
+}
+
+
+def build_export_query(
+        entity: ExportEntity,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        status: Optional[PostStatus] = None,
+        source: Optional[str] = None,
+        include_text: bool = False
+) -> Select:
+    if entity == ExportEntity.NEWS:
+        model = NewsItem
+        columns = [
+            NewsItem.id, NewsItem.title, NewsItem.url, NewsItem.summary,
+            NewsItem.source, NewsItem.published_at, NewsItem.created_at
+        ]
+        if include_text:
+            columns.append(NewsItem.raw_text)
+        query = select(*columns)
+        if source is not None:
+            query = query.where(NewsItem.source == source)
+    else:
+        model = Post
+        query = select(Post.id, Post.news_id, Post.status, Post.generated_text, Post.published_at, Post.created_at)
+        if status is not None:
+            query = query.where(Post.status == status)
+
+    if created_from is not None:
+        query = query.where(model.created_at >= created_from)
+    if created_to is not None:
+        query = query.where(model.created_at < created_to)
+    # Порядок индекса (created_at, id): выгрузку можно продолжить с последней полученной строки
+    return query.order_by(model.created_at, model.id)
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+async def stream_export(query: Select, export_format: ExportFormat) -> AsyncIterator[bytes]:
+    """Отдельная сессия: зависимость get_db закрылась бы раньше, чем закончится ответ"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if export_format == ExportFormat.CSV else None
+
+    async with async_session_factory() as session:
+        result = await session.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        if writer is not None:
+            writer.writerow(result.keys())
+
+        async for partition in result.partitions():
+            for row in partition:
+                if writer is not None:
+                    writer.writerow([_plain(value) for value in row])
+                else:
+                    record = {key: _plain(value) for key, value in row._mapping.items()}
+                    buffer.write(json.dumps(record, ensure_ascii=False))
+                    buffer.write('\n')
+            if buffer.tell() >= CHUNK_SIZE:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
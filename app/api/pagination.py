@@ -0,0 +1,59 @@
+"""
+Курсорная пагинация по (created_at, id): страница ищется по индексу, а не пропуском OFFSET строк,
+и порядок не меняется между запросами. Курсор следующей страницы отдается в заголовке X-Next-Cursor,
+тело ответа остается списком.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Sequence
+
+from sqlalchemy import Select, tuple_
+from starlette.exceptions import HTTPException
+from starlette.status import HTTP_400_BAD_REQUEST
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+MAX_PAGE_SIZE = 100
+
+
+def encode_token(values: list) -> str:
+    payload = json.dumps(values).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_token(cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise HTTPException(HTTP_400_BAD_REQUEST, 'Некорректный курсор')
+    if not isinstance(values, list):
+        raise HTTPException(HTTP_400_BAD_REQUEST, 'Некорректный курсор')
+    return values
+
+
+def encode_cursor(created_at: datetime, id: str) -> str:
+    return encode_token([created_at.isoformat(), id])
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        created_at, id = decode_token(cursor)
+        return datetime.fromisoformat(created_at), str(id)
+    except (ValueError, TypeError):
+        raise HTTPException(HTTP_400_BAD_REQUEST, 'Некорректный курсор')
+
+
+def paginate(query: Select, model, cursor: Optional[str], limit: int) -> Select:
+    """Страница от новых к старым; запрашивается на одну строку больше, чтобы узнать, есть ли следующая"""
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        query = query.where(tuple_(model.created_at, model.id) < tuple_(created_at, id))
+    return query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+
+def page(rows: Sequence, limit: int) -> tuple[Sequence, dict[str, str]]:
+    """Строки страницы и заголовки ответа: X-Next-Cursor, если страница не последняя"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, {NEXT_CURSOR_HEADER: encode_cursor(rows[-1].created_at, rows[-1].id)}
+    return rows, {}
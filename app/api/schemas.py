@@ -1,9 +1,33 @@
 from datetime import datetime
-from typing import Optional
+from typing import Dict, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator, model_validator
 
 from app.database import SourceType, PostStatus
+from app.news_parser.sites import PARSERS, REQUIRED_SELECTOR_KEYS, compile_selectors
+
+
+def _validate_parser(value: Optional[str]) -> Optional[str]:
+    if value is not None and value not in PARSERS:
+        raise ValueError(f'Неизвестный парсер. Доступны: {", ".join(sorted(PARSERS))}')
+    return value
+
+
+def _validate_selectors(value: Optional[Dict[str, str]]) -> Optional[Dict[str, str]]:
+    if value is not None:
+        try:
+            compile_selectors(value)
+        except Exception as e:
+            raise ValueError(f'Некорректные селекторы: {e}')
+    return value
+
+
+def validate_parser_selectors(parser: Optional[str], selectors: Optional[Dict[str, str]]) -> None:
+    """Парсеру selectors без list и title нечего разбирать"""
+    if parser == 'selectors':
+        missing = [key for key in REQUIRED_SELECTOR_KEYS if not (selectors or {}).get(key)]
+        if missing:
+            raise ValueError(f'Для парсера selectors не заданы селекторы: {", ".join(missing)}')
 
 
 class SourceBase(BaseModel):
@@ -11,10 +35,22 @@ class SourceBase(BaseModel):
     name: str = Field(..., description='Название источника')
     url: Optional[str] = Field(None, description='URL-адрес источника')
     enabled: bool = Field(default=True, description='Включен ли источник(для парсинга)')
+    parser: Optional[str] = Field(None, description='Имя парсера; если не задано — по selectors или по хосту url')
+    selectors: Optional[Dict[str, str]] = Field(
+        None,
+        description='CSS-селекторы универсального парсера: list, title, url, summary, time'
+    )
+
+    _check_parser = field_validator('parser')(_validate_parser)
+    _check_selectors = field_validator('selectors')(_validate_selectors)
 
 
 class SourceCreate(SourceBase):
-    pass
+    # Только на входе: SourceResponse не должен падать на уже сохраненных источниках
+    @model_validator(mode='after')
+    def _check_parser_selectors(self):
+        validate_parser_selectors(self.parser, self.selectors)
+        return self
 
 
 class SourceResponse(SourceBase):
@@ -30,10 +66,15 @@ class SourceUpdate(BaseModel):
     name: Optional[str] = None
     url: Optional[str] = None
     enabled: Optional[bool] = None
+    parser: Optional[str] = None
+    selectors: Optional[Dict[str, str]] = None
+
+    _check_parser = field_validator('parser')(_validate_parser)
+    _check_selectors = field_validator('selectors')(_validate_selectors)
 
 
 class KeywordBase(BaseModel):
-    word: str = Field(..., description='Ключевое слово')
+    word: str = Field(..., min_length=1, max_length=200, description='Ключевое слово или фраза')
 
 
 class KeywordCreate(KeywordBase):
@@ -61,6 +102,10 @@ class NewsItemResponse(BaseModel):
         from_attributes = True
 
 
+class NewsSearchResult(NewsItemResponse):
+    rank: float
+
+
 class PostResponse(BaseModel):
     id: str
     news_id: str
@@ -79,6 +124,7 @@ class TelegramAuthRequest(BaseModel):
     phone: str = Field(..., description='Номер телефона в формате +7XXXXXXXXXX')
     code: Optional[str] = Field(None, description='Код подтверждения из Telegram')
     password: Optional[str] = Field(None, description='Пароль двухфакторной аутентификации')
+    reader: bool = Field(False, description='Авторизовать сессию чтения каналов, а не публикации')
 
 
 class TelegramAuthResponse(BaseModel):
@@ -1,10 +1,19 @@
+"""
+Движки БД создаются лениво, по одному на процесс: форкнутые воркеры Celery не наследуют
+сокеты родителя, а открывают свой пул при первом запросе (см. dispose_engines в celery_worker.py).
+"""
+import os
+import threading
+from time import perf_counter
 from typing import AsyncGenerator, Generator
 
-from sqlalchemy import create_engine
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy import create_engine, Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
-from .models import Base
+from .migrate import sync_schema
 from ..config import settings
 
 
@@ -18,14 +27,135 @@ def get_db_async_url():
         db_url = db_url.replace('postgresql://', 'postgresql+asyncpg://')
     return db_url
 
-async_engine = create_async_engine(get_db_async_url(), echo=settings.DEBUG)
 
-# for Celery and Alembic
-sync_engine = create_engine(settings.DATABASE_URL, echo=settings.DEBUG)
+_pool_stats: dict[str, dict] = {}
+_pool_stats_lock = threading.Lock()
 
-async_session_factory = sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)  # noqa
 
-sync_session_factory = sessionmaker(sync_engine)
+def _record_checkout(name: str, wait: float, timed_out: bool = False):
+    with _pool_stats_lock:
+        stats = _pool_stats.setdefault(name, {'checkouts': 0, 'timeouts': 0, 'wait_total': 0.0, 'wait_max': 0.0})
+        stats['checkouts'] += 1
+        stats['timeouts'] += int(timed_out)
+        stats['wait_total'] += wait
+        stats['wait_max'] = max(stats['wait_max'], wait)
+
+
+class _TimedPoolMixin:
+    """Считает время ожидания соединения из пула, включая открытие нового соединения"""
+    stats_name = ''
+
+    def connect(self):
+        start = perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            _record_checkout(self.stats_name, perf_counter() - start, timed_out=True)
+            raise
+        _record_checkout(self.stats_name, perf_counter() - start)
+        return connection
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    stats_name = 'sync'
+
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    stats_name = 'async'
+
+
+def _engine_options(db_url: str, pool_class) -> dict:
+    options = {'echo': settings.DEBUG}
+    # У SQLite свой пул на файл, настройки размера пула к нему не применимы
+    if db_url.startswith('sqlite'):
+        return options
+    options.update(
+        poolclass=pool_class,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+    return options
+
+
+_engines: dict[str, Engine | AsyncEngine] = {}
+_engines_pid: int | None = None
+_engines_lock = threading.Lock()
+
+
+def _get_engine(kind: str):
+    global _engines_pid
+
+    with _engines_lock:
+        if _engines_pid != os.getpid():
+            # Движки, унаследованные через fork, не трогаем: их соединения принадлежат родителю
+            _engines.clear()
+            _engines_pid = os.getpid()
+        if kind not in _engines:
+            if kind == 'async':
+                db_url = get_db_async_url()
+                _engines[kind] = create_async_engine(db_url, **_engine_options(db_url, TimedAsyncQueuePool))
+            else:
+                db_url = settings.DATABASE_URL
+                # for Celery and Alembic
+                _engines[kind] = create_engine(db_url, **_engine_options(db_url, TimedQueuePool))
+        return _engines[kind]
+
+
+def get_async_engine() -> AsyncEngine:
+    return _get_engine('async')
+
+
+def get_sync_engine() -> Engine:
+    return _get_engine('sync')
+
+
+def dispose_engines():
+    """
+    Сбрасывает движки процесса после fork: соединения родителя закрываются без отправки
+    чего-либо в общий сокет (close=False), новые пулы создадутся при следующем запросе.
+    """
+    global _engines_pid
+
+    with _engines_lock:
+        for engine in _engines.values():
+            sync_engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+            sync_engine.dispose(close=False)
+        _engines.clear()
+        _engines_pid = os.getpid()
+
+
+async def close_async_engine():
+    engine = _engines.pop('async', None)
+    if engine is not None:
+        await engine.dispose()
+
+
+def pool_stats() -> dict[str, dict]:
+    """Статистика пулов текущего процесса: ожидание соединения и занятость пула"""
+    with _pool_stats_lock:
+        result = {name: dict(stats) for name, stats in _pool_stats.items()}
+    for name, stats in result.items():
+        stats['wait_avg'] = stats['wait_total'] / stats['checkouts'] if stats['checkouts'] else 0.0
+        engine = _engines.get(name)
+        pool = (engine.sync_engine if isinstance(engine, AsyncEngine) else engine).pool if engine else None
+        if isinstance(pool, QueuePool):
+            stats.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+    return result
+
+
+_async_sessionmaker = sessionmaker(class_=AsyncSession, expire_on_commit=False)  # noqa
+_sync_sessionmaker = sessionmaker()
+
+
+def async_session_factory() -> AsyncSession:
+    return _async_sessionmaker(bind=get_async_engine())
+
+
+def sync_session_factory() -> Session:
+    return _sync_sessionmaker(bind=get_sync_engine())
 
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
@@ -45,5 +175,5 @@ def get_db_sync() -> Generator[Session, None, None]:
 
 
 async def init_db():
-    async with async_engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    async with get_async_engine().begin() as conn:
+        await conn.run_sync(sync_schema)
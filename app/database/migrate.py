@@ -0,0 +1,134 @@
+"""
+Простая синхронизация схемы без Alembic: create_all создает только новые таблицы,
+поэтому недостающие колонки и индексы существующих таблиц добавляем здесь.
+Запуск вручную: python -m app.database.migrate [--backfill-hashes] [--partition-posts] [--vacuum]
+"""
+import argparse
+import logging
+
+from sqlalchemy import Connection, bindparam, func, inspect, or_, select, text, tuple_, update
+from sqlalchemy.schema import CreateColumn
+
+from .models import Base, NewsItem, Post
+from .partitions import ensure_partitions, is_partitioned, partition_posts
+from .search import ensure_search_index, vacuum_sqlite
+from ..dedup.normalize import title_hash, url_hash
+
+logger = logging.getLogger(__name__)
+
+
+def sync_schema(conn: Connection) -> None:
+    Base.metadata.create_all(conn)
+
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_ddl = CreateColumn(column).compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column_ddl}'))
+            logger.info(f'Добавлена колонка {table.name}.{column.name}')
+
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(conn)
+                logger.info(f'Создан индекс {index.name}')
+
+    ensure_search_index(conn)
+
+    if conn.dialect.name == 'postgresql':
+        if is_partitioned(conn, Post.__tablename__):
+            ensure_partitions(conn)
+        else:
+            logger.warning('Таблица posts без партиций: python -m app.database.migrate --partition-posts')
+
+
+def backfill_news_hashes(conn: Connection, batch_size: int = 1000) -> int:
+    """
+    Заполняет url_hash/title_hash у старых новостей пачками с коммитом после каждой.
+    Если хеш уже занят более ранней новостью (старый дубликат), он остается пустым,
+    чтобы не нарушить уникальный индекс. Уже заполненные хеши не меняются, повторный запуск безопасен.
+    """
+    table = NewsItem.__table__
+    columns = table.c
+    pending = or_(columns.title_hash.is_(None), columns.url.is_not(None) & columns.url_hash.is_(None))
+    set_hashes = (
+        update(table)
+        .where(columns.id == bindparam('row_id'))
+        .values(
+            url_hash=func.coalesce(columns.url_hash, bindparam('new_url_hash')),
+            title_hash=func.coalesce(columns.title_hash, bindparam('new_title_hash'))
+        )
+    )
+
+    cursor = None
+    updated = 0
+    while True:
+        query = select(
+            columns.id, columns.url, columns.title, columns.url_hash, columns.title_hash, columns.created_at
+        ).where(pending)
+        if cursor is not None:
+            query = query.where(tuple_(columns.created_at, columns.id) > cursor)
+        rows = conn.execute(query.order_by(columns.created_at, columns.id).limit(batch_size)).all()
+        if not rows:
+            break
+        cursor = (rows[-1].created_at, rows[-1].id)
+
+        hashes = {row.id: (url_hash(row.url), title_hash(row.title)) for row in rows}
+        url_keys = {url_key for url_key, _ in hashes.values() if url_key}
+        title_keys = {title_key for _, title_key in hashes.values() if title_key}
+        # Хеши самой пачки не считаются занятыми другими новостями: иначе повторный запуск
+        # обнулил бы их у строк, где второй хеш пуст намеренно
+        taken = conn.execute(
+            select(columns.url_hash, columns.title_hash)
+            .where(or_(columns.url_hash.in_(url_keys), columns.title_hash.in_(title_keys)))
+            .where(columns.id.notin_(list(hashes)))
+        ).all()
+        taken_urls = {row.url_hash for row in taken} | {row.url_hash for row in rows if row.url_hash}
+        taken_titles = {row.title_hash for row in taken} | {row.title_hash for row in rows if row.title_hash}
+
+        params = []
+        for row in rows:
+            url_key, title_key = hashes[row.id]
+            # Заполненный хеш остается прежним (coalesce в UPDATE), новый вычисляем только для пустого
+            url_key = url_key if row.url_hash is None and url_key not in taken_urls else None
+            title_key = title_key if row.title_hash is None and title_key not in taken_titles else None
+            taken_urls.add(url_key)
+            taken_titles.add(title_key)
+            params.append({'row_id': row.id, 'new_url_hash': url_key, 'new_title_hash': title_key})
+
+        conn.execute(set_hashes, params)
+        conn.commit()
+        updated += len(params)
+        logger.info(f'Заполнены хеши для {updated} новостей')
+
+    return updated
+
+
+if __name__ == '__main__':
+    from .db import get_sync_engine
+
+    arg_parser = argparse.ArgumentParser(description='Синхронизация схемы БД')
+    arg_parser.add_argument('--backfill-hashes', action='store_true', help='заполнить хеши дедупликации у старых новостей')
+    arg_parser.add_argument('--partition-posts', action='store_true', help='перевести posts на помесячные партиции')
+    arg_parser.add_argument('--vacuum', action='store_true', help='сжать базу SQLite и пересобрать индекс поиска')
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sync_engine = get_sync_engine()
+    with sync_engine.begin() as connection:
+        sync_schema(connection)
+    logger.info('Схема БД синхронизирована')
+
+    if args.partition_posts:
+        with sync_engine.begin() as connection:
+            partition_posts(connection)
+
+    if args.backfill_hashes:
+        with sync_engine.connect() as connection:
+            backfill_news_hashes(connection)
+
+    if args.vacuum:
+        vacuum_sqlite(sync_engine)
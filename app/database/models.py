@@ -2,7 +2,7 @@ from datetime import datetime
 from typing import Optional
 from uuid import uuid4
 
-from sqlalchemy import String, Boolean, Text, ForeignKey, Enum as SQLEnum, TypeDecorator
+from sqlalchemy import String, Boolean, Text, ForeignKey, Enum as SQLEnum, TypeDecorator, JSON, Index, text
 from sqlalchemy.orm import declarative_base, relationship, Mapped, mapped_column
 
 from .types import PostStatus, SourceType
@@ -45,14 +45,23 @@ class NewsItem(Base):
     )
     title: Mapped[str] = mapped_column(nullable=False)
     url: Mapped[Optional[str]] = mapped_column(String, nullable=True, index=True)
+    # Хеши нормализованных url и заголовка (app.dedup.normalize); дубликаты отсекает сама БД.
+    # Колонки nullable: у старых строк-дубликатов хеш остается пустым после бэкфилла
+    url_hash: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
+    title_hash: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
     summary: Mapped[str] = mapped_column(Text)
-    source: Mapped[str] = mapped_column(String, nullable=False) # TODO: foreign key to Source
+    source: Mapped[str] = mapped_column(String, nullable=False, index=True) # TODO: foreign key to Source
     published_at: Mapped[datetime] = mapped_column(nullable=False, default=datetime.now)
     raw_text: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
-    created_at: Mapped[datetime] = mapped_column(nullable=False, default=datetime.now)
+    created_at: Mapped[datetime] = mapped_column(nullable=False, default=datetime.now, index=True)
 
     posts = relationship("Post", back_populates="news_item")
 
+    __table_args__ = (
+        Index('ux_news_items_url_hash', 'url_hash', unique=True),
+        Index('ux_news_items_title_hash', 'title_hash', unique=True),
+    )
+
 
 class Post(Base):
     __tablename__ = "posts"
@@ -61,7 +70,7 @@ class Post(Base):
         index=True,
         default=generate_uuid
     )
-    news_id: Mapped[str] = mapped_column(ForeignKey("news_items.id"))
+    news_id: Mapped[str] = mapped_column(ForeignKey("news_items.id"), index=True)
     generated_text: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     published_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
     status: Mapped[PostStatus] = mapped_column(
@@ -69,10 +78,35 @@ class Post(Base):
         nullable=False,
         default=PostStatus.NEW
     )
-    created_at: Mapped[datetime] = mapped_column(nullable=False, default=datetime.now)
+    # Пачка Batch API, в которой генерировался пост (GenerationBatch.id)
+    batch_id: Mapped[Optional[str]] = mapped_column(String, nullable=True, index=True)
+    # Ключ партиционирования на Postgres входит в первичный ключ таблицы; для ORM пост определяется по id
+    created_at: Mapped[datetime] = mapped_column(primary_key=True, nullable=False, default=datetime.now)
 
     news_item = relationship("NewsItem", back_populates="posts")
 
+    __mapper_args__ = {'primary_key': [id]}
+
+    # Очередь задач генерации и публикации: частичные индексы содержат только ожидающие посты,
+    # поэтому выборка пачки не зависит от размера истории. Enum хранится по имени члена
+    __table_args__ = (
+        Index(
+            'ix_posts_new_queue', 'created_at', 'id',
+            postgresql_where=text("status = 'NEW'"),
+            sqlite_where=text("status = 'NEW'")
+        ),
+        Index(
+            'ix_posts_generated_queue', 'created_at', 'id',
+            postgresql_where=text("status = 'GENERATED'"),
+            sqlite_where=text("status = 'GENERATED'")
+        ),
+        # Курсорная пагинация API: все посты и посты с фильтром по статусу
+        Index('ix_posts_created_at_id', 'created_at', 'id'),
+        Index('ix_posts_status_created_at_id', 'status', 'created_at', 'id'),
+        # Помесячные партиции (app.database.partitions); другие диалекты параметр игнорируют
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+
 
 class Source(Base):
     __tablename__ = 'sources'
@@ -88,8 +122,23 @@ class Source(Base):
     name: Mapped[str] = mapped_column(String, nullable=False)
     url: Mapped[Optional[str]] = mapped_column(String, nullable=True, index=True)
     enabled: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
+    # Имя парсера из реестра app.news_parser.sites.PARSERS; если не задано — по selectors или хосту url
+    parser: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    # CSS-селекторы для универсального парсера: list, title, url, summary, time
+    selectors: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    # Валидаторы последнего ответа для условных GET-запросов
+    http_etag: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    http_last_modified: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    # Дата (naive UTC) самой свежей сохраненной новости: парсер останавливается на уже виденных
+    cursor_published_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+    # id последнего прочитанного сообщения Telegram-канала (min_id для следующего запуска)
+    cursor_message_id: Mapped[Optional[int]] = mapped_column(nullable=True)
     created_at: Mapped[datetime] = mapped_column(nullable=False, default=datetime.now)
 
+    __table_args__ = (
+        Index('ix_sources_created_at_id', 'created_at', 'id'),
+    )
+
 
 class Keyword(Base):
     __tablename__ = "keywords"
@@ -100,3 +149,20 @@ class Keyword(Base):
     )
     word: Mapped[str] = mapped_column(String, nullable=False)
     created_at: Mapped[datetime] = mapped_column(nullable=False, default=datetime.now)
+
+
+class GenerationBatch(Base):
+    """Пачка генерации в OpenAI Batch API (app.ai.batch); id совпадает с id батча в OpenAI"""
+    __tablename__ = 'generation_batches'
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    # Статус батча в OpenAI: validating, in_progress, finalizing, completed, failed, expired, cancelled
+    status: Mapped[str] = mapped_column(String, nullable=False)
+    input_file_id: Mapped[str] = mapped_column(String, nullable=False)
+    output_file_id: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    error_file_id: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    post_count: Mapped[int] = mapped_column(nullable=False, default=0)
+    generated_count: Mapped[int] = mapped_column(nullable=False, default=0)
+    failed_count: Mapped[int] = mapped_column(nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(nullable=False, default=datetime.now)
+    # Результаты перенесены в posts; пока пусто, батч опрашивается задачей poll_generation_batches
+    applied_at: Mapped[Optional[datetime]] = mapped_column(nullable=True, index=True)
@@ -0,0 +1,134 @@
+"""
+Помесячные партиции posts на Postgres (PARTITION BY RANGE (created_at)).
+
+Партиции называются posts_YYYY_MM и создаются заранее на PARTITION_PREMAKE_MONTHS вперед;
+posts_default подстраховывает вставку, если нужной партиции почему-то нет.
+На SQLite таблица обычная, а старые строки удаляет задача хранения (app.database.retention).
+"""
+import logging
+import re
+from datetime import datetime
+from typing import List, Tuple
+
+from sqlalchemy import Connection, text
+
+from app.config import settings
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME_RE = re.compile(r'^(?P<table>\w+)_(?P<year>\d{4})_(?P<month>\d{2})$')
+
+
+def month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    month_index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=month_index // 12, month=month_index % 12 + 1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f'{table}_{month:%Y_%m}'
+
+
+def is_partitioned(conn: Connection, table: str) -> bool:
+    if conn.dialect.name != 'postgresql':
+        return False
+    relkind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"),
+        {'table': table}
+    ).scalar()
+    return relkind == 'p'
+
+
+def list_partitions(conn: Connection, table: str) -> List[Tuple[str, datetime]]:
+    """Помесячные партиции таблицы с началом их месяца, от старых к новым"""
+    names = conn.execute(text(
+        'SELECT child.relname FROM pg_inherits '
+        'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+        'WHERE pg_inherits.inhparent = to_regclass(:table)'
+    ), {'table': table}).scalars()
+
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME_RE.match(name)
+        if match and match['table'] == table:
+            partitions.append((name, datetime(int(match['year']), int(match['month']), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def ensure_partitions(
+        conn: Connection,
+        table: str = Post.__tablename__,
+        since: datetime | None = None,
+        months_ahead: int = settings.PARTITION_PREMAKE_MONTHS
+) -> List[str]:
+    """Создает недостающие партиции от месяца since (по умолчанию текущего) на months_ahead вперед"""
+    if not is_partitioned(conn, table):
+        return []
+
+    conn.execute(text(f'CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT'))
+    existing = {name for name, _ in list_partitions(conn, table)}
+    month = month_start(since or datetime.now())
+    last_month = add_months(month_start(datetime.now()), months_ahead)
+
+    created = []
+    while month <= last_month:
+        name = partition_name(table, month)
+        if name not in existing:
+            conn.execute(text(
+                f"CREATE TABLE {name} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            ))
+            created.append(name)
+            logger.info(f'Создана партиция {name}')
+        month = add_months(month, 1)
+    return created
+
+
+def remove_partitions_before(conn: Connection, table: str, cutoff: datetime, archive: bool) -> List[str]:
+    """
+    Отключает от таблицы партиции, целиком лежащие раньше cutoff: с archive=True они остаются
+    отдельными таблицами (posts_YYYY_MM) для выгрузки в архив, иначе удаляются. Это мгновенная
+    операция над метаданными вместо построчного DELETE.
+    """
+    removed = []
+    for name, month in list_partitions(conn, table):
+        if add_months(month, 1) > cutoff:
+            break
+        conn.execute(text(f'ALTER TABLE {table} DETACH PARTITION {name}'))
+        if not archive:
+            conn.execute(text(f'DROP TABLE {name}'))
+        removed.append(name)
+        logger.info(f'Партиция {name} {"отключена и оставлена в архиве" if archive else "удалена"}')
+    return removed
+
+
+def partition_posts(conn: Connection) -> int:
+    """
+    Переводит существующую обычную таблицу posts на партиции: создает партиционированную таблицу,
+    переносит строки одной командой INSERT ... SELECT и удаляет старую. Выполнять в одной транзакции
+    при остановленных воркерах.
+    """
+    table = Post.__tablename__
+    if conn.dialect.name != 'postgresql' or is_partitioned(conn, table):
+        return 0
+
+    legacy = f'{table}_unpartitioned'
+    conn.execute(text(f'ALTER TABLE {table} RENAME TO {legacy}'))
+    conn.execute(text(f'ALTER TABLE {legacy} RENAME CONSTRAINT {table}_pkey TO {legacy}_pkey'))
+    # Имена индексов общие для схемы: старые удаляем, новые создаст create()
+    for index in Post.__table__.indexes:
+        conn.execute(text(f'DROP INDEX IF EXISTS {index.name}'))
+
+    Post.__table__.create(conn)
+    oldest = conn.execute(text(f'SELECT min(created_at) FROM {legacy}')).scalar()
+    ensure_partitions(conn, table, since=oldest)
+
+    columns = ', '.join(column.name for column in Post.__table__.columns)
+    moved = conn.execute(text(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {legacy}')).rowcount
+    conn.execute(text(f'DROP TABLE {legacy}'))
+    logger.info(f'Таблица {table} переведена на помесячные партиции, перенесено строк: {moved}')
+    return moved
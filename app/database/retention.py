@@ -0,0 +1,96 @@
+"""
+Политика хранения: старые партиции posts отключаются или удаляются целиком, зависшие
+неопубликованные посты и старые новости удаляются пачками по индексам, без построчных DELETE из ORM.
+Запускается задачей app.tasks.apply_retention.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Dict
+
+from sqlalchemy import ColumnElement, Connection, Table, delete, select
+
+from app.config import settings
+from .models import NewsItem, Post
+from .partitions import add_months, ensure_partitions, is_partitioned, month_start, remove_partitions_before
+from .types import PostStatus
+
+logger = logging.getLogger(__name__)
+
+# Посты, которые больше не обрабатываются, и посты, ожидающие генерации или публикации
+FINISHED_UNPUBLISHED_STATUSES = (PostStatus.FAILED, PostStatus.SKIPPED)
+QUEUED_STATUSES = (PostStatus.NEW, PostStatus.GENERATED, PostStatus.BATCHED)
+
+
+def delete_in_batches(conn: Connection, table: Table, condition: ColumnElement, batch_size: int) -> int:
+    """DELETE ... WHERE id IN (SELECT id ... LIMIT n) с коммитом после каждой пачки, чтобы не держать долгих блокировок"""
+    deleted = 0
+    while True:
+        ids = select(table.c.id).where(condition).limit(batch_size).scalar_subquery()
+        count = conn.execute(delete(table).where(table.c.id.in_(ids))).rowcount
+        conn.commit()
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+def delete_stale_posts(conn: Connection, before: datetime, queued_before: datetime, batch_size: int) -> int:
+    """Неудавшиеся и пропущенные посты старше before; ожидающие — только вне окна очередей (queued_before)"""
+    posts = Post.__table__
+    condition = (
+        (posts.c.status.in_(FINISHED_UNPUBLISHED_STATUSES) & (posts.c.created_at < before))
+        | (posts.c.status.in_(QUEUED_STATUSES) & (posts.c.created_at < queued_before))
+    )
+    return delete_in_batches(conn, posts, condition, batch_size)
+
+
+def expire_posts(conn: Connection, before: datetime, archive: bool, batch_size: int) -> int:
+    """На партиционированной таблице убирает целые месяцы до before, иначе удаляет строки пачками"""
+    if is_partitioned(conn, Post.__tablename__):
+        removed = remove_partitions_before(conn, Post.__tablename__, month_start(before), archive)
+        conn.commit()
+        return len(removed)
+    posts = Post.__table__
+    return delete_in_batches(conn, posts, posts.c.created_at < before, batch_size)
+
+
+def delete_old_news(conn: Connection, before: datetime, batch_size: int) -> int:
+    """Удаляет новости старше before вместе с их постами: сначала посты пачки, потом сами новости"""
+    news = NewsItem.__table__
+    posts = Post.__table__
+    deleted = 0
+    while True:
+        ids = conn.execute(select(news.c.id).where(news.c.created_at < before).limit(batch_size)).scalars().all()
+        if not ids:
+            return deleted
+        conn.execute(delete(posts).where(posts.c.news_id.in_(ids)))
+        deleted += conn.execute(delete(news).where(news.c.id.in_(ids))).rowcount
+        conn.commit()
+        if len(ids) < batch_size:
+            return deleted
+
+
+def apply_retention(conn: Connection) -> Dict[str, int]:
+    now = datetime.now()
+    batch_size = settings.RETENTION_BATCH_SIZE
+
+    created = ensure_partitions(conn)
+    conn.commit()
+
+    result = {
+        'partitions_created': len(created),
+        'stale_posts_deleted': delete_stale_posts(
+            conn,
+            now - timedelta(days=settings.RETENTION_STALE_POST_DAYS),
+            now - timedelta(days=settings.QUEUE_SCAN_DAYS),
+            batch_size
+        ),
+        'posts_expired': expire_posts(
+            conn,
+            add_months(month_start(now), -settings.RETENTION_POSTS_MONTHS),
+            settings.RETENTION_ARCHIVE_PARTITIONS,
+            batch_size
+        ),
+        'news_deleted': delete_old_news(conn, now - timedelta(days=settings.RETENTION_NEWS_DAYS), batch_size),
+    }
+    logger.info(f'Политика хранения применена: {result}')
+    return result
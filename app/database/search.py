@@ -0,0 +1,164 @@
+"""
+Полнотекстовый поиск по новостям (title, summary, raw_text).
+
+Postgres: хранимая генерируемая колонка news_items.search_vector (tsvector) с GIN-индексом —
+БД сама пересчитывает ее при вставке и при загрузке полного текста.
+SQLite: внешняя FTS5-таблица news_items_fts, синхронизируемая триггерами. Индекс ссылается на неявный
+rowid news_items (первичный ключ текстовый), а VACUUM вправе его перенумеровать — тогда поиск молча
+вернет не те новости. Поэтому базу SQLite сжимаем только через vacuum_sqlite (python -m app.database.migrate
+--vacuum): после VACUUM индекс пересобирается.
+Вызывается из sync_schema; добавление колонки в большую таблицу Postgres перезаписывает ее один раз.
+"""
+import logging
+import re
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+from sqlalchemy import (
+    Connection, Engine, Select, cast, column, false, func, inspect, literal_column, select, table, text, tuple_
+)
+from sqlalchemy.dialects.postgresql import REGCONFIG
+
+from app.config import settings
+from .models import NewsItem
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'news_items_fts'
+# Вес совпадений: заголовок важнее анонса, анонс важнее полного текста
+WEIGHTS = (10.0, 5.0, 1.0)
+WORD_RE = re.compile(r'\w+')
+
+
+class SearchSort(str, Enum):
+    RANK = 'rank'
+    DATE = 'date'
+
+
+def ensure_search_index(conn: Connection) -> None:
+    if conn.dialect.name == 'postgresql':
+        _ensure_postgres(conn)
+    elif conn.dialect.name == 'sqlite':
+        _ensure_sqlite(conn)
+
+
+def _ensure_postgres(conn: Connection) -> None:
+    columns = {column['name'] for column in inspect(conn).get_columns(NewsItem.__tablename__)}
+    if 'search_vector' not in columns:
+        language = settings.SEARCH_LANGUAGE
+        conn.execute(text(
+            "ALTER TABLE news_items ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+            f"setweight(to_tsvector('{language}', coalesce(title, '')), 'A') || "
+            f"setweight(to_tsvector('{language}', coalesce(summary, '')), 'B') || "
+            f"setweight(to_tsvector('{language}', coalesce(raw_text, '')), 'C')"
+            ") STORED"
+        ))
+        logger.info('Добавлена колонка news_items.search_vector')
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_news_items_search_vector ON news_items USING GIN (search_vector)'
+    ))
+
+
+def _ensure_sqlite(conn: Connection) -> None:
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+    ).scalar()
+    if exists:
+        return
+
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        "title, summary, raw_text, content='news_items', content_rowid='rowid', "
+        "tokenize='unicode61 remove_diacritics 2')"
+    ))
+    fts_values = 'new.rowid, new.title, new.summary, new.raw_text'
+    fts_delete = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, summary, raw_text) " \
+                 "VALUES ('delete', old.rowid, old.title, old.summary, old.raw_text);"
+    conn.execute(text(
+        f"CREATE TRIGGER news_items_fts_insert AFTER INSERT ON news_items BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, title, summary, raw_text) VALUES ({fts_values}); END"
+    ))
+    conn.execute(text(f"CREATE TRIGGER news_items_fts_delete AFTER DELETE ON news_items BEGIN {fts_delete} END"))
+    conn.execute(text(
+        f"CREATE TRIGGER news_items_fts_update AFTER UPDATE ON news_items BEGIN {fts_delete} "
+        f"INSERT INTO {FTS_TABLE}(rowid, title, summary, raw_text) VALUES ({fts_values}); END"
+    ))
+    # Индексируем уже сохраненные новости
+    rebuild_search_index(conn)
+    logger.info(f'Создана таблица полнотекстового поиска {FTS_TABLE}')
+
+
+def rebuild_search_index(conn: Connection) -> None:
+    """Заново строит FTS5-индекс из news_items по текущим rowid; на Postgres ничего не делает"""
+    if conn.dialect.name == 'sqlite':
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def vacuum_sqlite(engine: Engine) -> None:
+    """VACUUM базы SQLite с пересборкой FTS5-индекса: VACUUM может изменить rowid новостей"""
+    if engine.dialect.name != 'sqlite':
+        return
+    # VACUUM нельзя выполнить внутри транзакции
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text('VACUUM'))
+    with engine.begin() as conn:
+        rebuild_search_index(conn)
+    logger.info(f'База SQLite сжата, индекс {FTS_TABLE} пересобран')
+
+
+def _fts5_query(query: str) -> str:
+    """Слова запроса как отдельные фразы FTS5 (все обязательны): спецсимволы синтаксиса не ломают запрос"""
+    return ' '.join(f'"{word}"' for word in WORD_RE.findall(query))
+
+
+def search_news_query(
+        dialect: str,
+        query: str,
+        sort: SearchSort = SearchSort.RANK,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        after: Optional[tuple] = None,
+        limit: int = 20
+) -> Select:
+    """
+    Выборка (NewsItem, score) от лучших к худшим или от новых к старым.
+    after — ключ последней строки предыдущей страницы: (score, id) или (created_at, id).
+    Запрашивается limit + 1 строк, чтобы узнать, есть ли следующая страница.
+    """
+    if dialect == 'postgresql':
+        tsquery = func.websearch_to_tsquery(cast(settings.SEARCH_LANGUAGE, REGCONFIG), query)
+        search_vector = literal_column('news_items.search_vector')
+        matches = (
+            select(
+                NewsItem.id.label('id'),
+                NewsItem.created_at.label('created_at'),
+                func.ts_rank_cd(search_vector, tsquery).label('score')
+            )
+            .where(search_vector.op('@@')(tsquery))
+        )
+    else:
+        fts = table(FTS_TABLE, column('rowid'))
+        matches = (
+            select(
+                NewsItem.id.label('id'),
+                NewsItem.created_at.label('created_at'),
+                # bm25 меньше у лучших совпадений
+                (-func.bm25(literal_column(FTS_TABLE), *WEIGHTS)).label('score')
+            )
+            .select_from(fts)
+            .join(NewsItem.__table__, literal_column('news_items.rowid') == fts.c.rowid)
+            .where(literal_column(FTS_TABLE).op('MATCH')(_fts5_query(query)) if WORD_RE.search(query) else false())
+        )
+
+    if created_from is not None:
+        matches = matches.where(NewsItem.created_at >= created_from)
+    if created_to is not None:
+        matches = matches.where(NewsItem.created_at < created_to)
+    matches = matches.subquery('matches')
+
+    sort_key = matches.c.score if sort == SearchSort.RANK else matches.c.created_at
+    result = select(NewsItem, matches.c.score).join(matches, NewsItem.id == matches.c.id)
+    if after is not None:
+        result = result.where(tuple_(sort_key, matches.c.id) < tuple_(*after))
+    return result.order_by(sort_key.desc(), matches.c.id.desc()).limit(limit + 1)
@@ -7,9 +7,14 @@ class PostStatus(str, Enum):
     GENERATED = "generated"
     PUBLISHED = "published"
     FAILED = "failed"
+    # Новость не прошла фильтр ключевых слов и не отправлялась в OpenAI
+    SKIPPED = "skipped"
+    # Запрос отправлен в OpenAI Batch API (Post.batch_id), ждем результата
+    BATCHED = "batched"
 
 
 class SourceType(str, Enum):
     """Типы источников новостей"""
     SITE = "site"
     TG = "tg"
+    RSS = "rss"
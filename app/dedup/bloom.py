@@ -0,0 +1,260 @@
+"""
+Масштабируемый фильтр Блума в Redis для уже виденных новостей.
+
+Перед SQL-проверкой дубликатов новость ищется в фильтре: если ни хеша url, ни хеша заголовка
+в нем нет, новость точно новая и запрос в БД не нужен; в БД идут только вероятные совпадения.
+Фильтр — цепочка битовых массивов Redis: когда текущий заполнен, добавляется следующий,
+вдвое больше и с вдвое меньшей вероятностью ошибки, так что общая ошибка не превышает BLOOM_ERROR_RATE.
+
+Пока фильтр ни разу не собран из БД (флаг built в meta), он пуст и «точно новых» не бывает:
+contains считает вероятными все ключи, и проверка целиком идет в SQL.
+
+Пересборка из БД: python -m app.dedup.bloom rebuild
+Статистика: python -m app.dedup.bloom stats
+"""
+import argparse
+import json
+import logging
+import math
+from hashlib import blake2b
+from time import time
+from typing import Iterable, List, Optional, Sequence
+
+from redis import Redis, WatchError
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_BITS = 2 ** 32
+GROWTH = 2
+TIGHTENING = 0.5
+
+
+def _filter_params(capacity: int, error_rate: float, index: int) -> dict:
+    capacity = capacity * GROWTH ** index
+    error = error_rate * (1 - TIGHTENING) * TIGHTENING ** index
+    bits = min(MAX_BITS - 1, math.ceil(-capacity * math.log(error) / math.log(2) ** 2))
+    hashes = max(1, round(bits / capacity * math.log(2)))
+    return {'capacity': capacity, 'bits': bits, 'hashes': hashes}
+
+
+def _positions(key: str, bits: int, hashes: int) -> List[int]:
+    digest = blake2b(key.encode('utf-8'), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'big')
+    h2 = int.from_bytes(digest[8:], 'big') | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+class ScalableBloomFilter:
+    _unbuilt_warned = False
+
+    def __init__(
+            self,
+            redis: Redis,
+            name: str = 'news',
+            capacity: int = settings.BLOOM_CAPACITY,
+            error_rate: float = settings.BLOOM_ERROR_RATE
+    ):
+        self.redis = redis
+        self.name = name
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.meta_key = f'bloom:{name}:meta'
+        self.stats_key = f'bloom:{name}:stats'
+
+    def _filter_key(self, meta: dict, index: int) -> str:
+        return f'bloom:{self.name}:{meta["generation"]}:{index}'
+
+    def _new_meta(self, generation: int, capacity: int, built: bool = False) -> dict:
+        return {
+            'generation': generation,
+            'capacity': capacity,
+            'error_rate': self.error_rate,
+            'filters': [_filter_params(capacity, self.error_rate, 0)],
+            # Фильтр содержит все новости БД; до пересборки в нем только добавленные после запуска
+            'built': built,
+        }
+
+    def _load_meta(self) -> dict:
+        raw = self.redis.get(self.meta_key)
+        if raw:
+            return json.loads(raw)
+        meta = self._new_meta(int(time()), self.capacity)
+        if not self.redis.set(self.meta_key, json.dumps(meta), nx=True):
+            return json.loads(self.redis.get(self.meta_key))
+        return meta
+
+    def contains(self, keys: Sequence[str]) -> List[bool]:
+        """Для каждого ключа: False — точно не добавлялся, True — вероятно добавлялся"""
+        if not keys:
+            return []
+        meta = self._load_meta()
+        if not meta.get('built'):
+            if not self._unbuilt_warned:
+                logger.warning(
+                    f'Фильтр Блума {self.name} не собран, дубликаты проверяются в БД: python -m app.dedup.bloom rebuild'
+                )
+                ScalableBloomFilter._unbuilt_warned = True
+            return [True] * len(keys)
+        pipeline = self.redis.pipeline(transaction=False)
+        for key in keys:
+            for index, params in enumerate(meta['filters']):
+                fields = []
+                for position in _positions(key, params['bits'], params['hashes']):
+                    fields += ['GET', 'u1', position]
+                pipeline.execute_command('BITFIELD', self._filter_key(meta, index), *fields)
+        replies = pipeline.execute()
+
+        filters_count = len(meta['filters'])
+        return [
+            any(all(bits) for bits in replies[i * filters_count:(i + 1) * filters_count])
+            for i in range(len(keys))
+        ]
+
+    def add(self, keys: Sequence[str]) -> None:
+        keys = list(keys)
+        while keys:
+            meta = self._load_meta()
+            index = len(meta['filters']) - 1
+            count = int(self.redis.get(f'{self._filter_key(meta, index)}:count') or 0)
+            # Переполненный уровень дает больше ложных срабатываний, чем рассчитано: остаток идет в следующий
+            room = meta['filters'][index]['capacity'] - count
+            if room > len(keys):
+                self._add_to(meta, keys)
+                return
+            if room > 0:
+                self._add_to(meta, keys[:room])
+                keys = keys[room:]
+            self._grow(len(meta['filters']))
+
+    def _add_to(self, meta: dict, keys: Iterable[str]) -> int:
+        index = len(meta['filters']) - 1
+        params = meta['filters'][index]
+        filter_key = self._filter_key(meta, index)
+        pipeline = self.redis.pipeline(transaction=False)
+        added = 0
+        for key in keys:
+            fields = []
+            for position in _positions(key, params['bits'], params['hashes']):
+                fields += ['SET', 'u1', position, 1]
+            pipeline.execute_command('BITFIELD', filter_key, *fields)
+            added += 1
+        pipeline.incrby(f'{filter_key}:count', added)
+        return pipeline.execute()[-1]
+
+    def _grow(self, filters_count: int) -> None:
+        # Несколько воркеров могут заполнить фильтр одновременно: новый уровень добавляет только один
+        with self.redis.pipeline() as pipeline:
+            try:
+                pipeline.watch(self.meta_key)
+                meta = json.loads(pipeline.get(self.meta_key))
+                if len(meta['filters']) != filters_count:
+                    return
+                meta['filters'].append(_filter_params(meta['capacity'], meta['error_rate'], filters_count))
+                pipeline.multi()
+                pipeline.set(self.meta_key, json.dumps(meta))
+                pipeline.execute()
+                logger.info(f'Фильтр Блума {self.name}: добавлен уровень {filters_count}')
+            except WatchError:
+                pass
+
+    def record(self, checks: int, probable_hits: int, false_positives: int) -> None:
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.hincrby(self.stats_key, 'checks', checks)
+        pipeline.hincrby(self.stats_key, 'probable_hits', probable_hits)
+        pipeline.hincrby(self.stats_key, 'false_positives', false_positives)
+        pipeline.execute()
+
+    def stats(self) -> dict:
+        meta = self._load_meta()
+        counters = {key.decode(): int(value) for key, value in self.redis.hgetall(self.stats_key).items()}
+        checks = counters.get('checks', 0)
+        probable_hits = counters.get('probable_hits', 0)
+        false_positives = counters.get('false_positives', 0)
+        true_hits = probable_hits - false_positives
+
+        counts = self.redis.mget([f'{self._filter_key(meta, i)}:count' for i in range(len(meta['filters']))])
+        expected_fp_rate = 1.0
+        for params, count in zip(meta['filters'], counts):
+            fill = (1 - math.exp(-params['hashes'] * int(count or 0) / params['bits'])) ** params['hashes']
+            expected_fp_rate *= 1 - fill
+
+        return {
+            'built': bool(meta.get('built')),
+            'filters': len(meta['filters']),
+            'items': sum(int(count or 0) for count in counts),
+            'checks': checks,
+            'probable_hits': probable_hits,
+            'false_positives': false_positives,
+            # Доля ложных срабатываний среди новостей, которых в БД действительно не было
+            'observed_fp_rate': false_positives / (checks - true_hits) if checks > true_hits else 0.0,
+            'expected_fp_rate': 1 - expected_fp_rate,
+            'sql_skipped_ratio': (checks - probable_hits) / checks if checks else 0.0,
+        }
+
+    def rebuild(self, keys: Iterable[str], expected_items: int, batch_size: int = 5000) -> int:
+        """
+        Собирает фильтр заново в новом поколении ключей и атомарно переключается на него,
+        чтобы проверки во время пересборки продолжали работать со старым фильтром.
+        """
+        old_meta = self._load_meta()
+        meta = self._new_meta(
+            old_meta['generation'] + 1, max(self.capacity, int(expected_items * 1.2)), built=True
+        )
+
+        added = 0
+        batch = []
+        for key in keys:
+            batch.append(key)
+            if len(batch) >= batch_size:
+                added = self._add_to(meta, batch)
+                batch = []
+        if batch:
+            added = self._add_to(meta, batch)
+
+        self.redis.set(self.meta_key, json.dumps(meta))
+        old_keys = [self._filter_key(old_meta, i) for i in range(len(old_meta['filters']))]
+        self.redis.delete(*old_keys, *(f'{key}:count' for key in old_keys))
+        self.redis.delete(self.stats_key)
+        return added
+
+
+def news_bloom_keys(url_hash: Optional[str], title_hash: Optional[str]) -> List[str]:
+    return [f'{prefix}:{value}' for prefix, value in (('u', url_hash), ('t', title_hash)) if value]
+
+
+def get_news_bloom() -> ScalableBloomFilter:
+    from app.redis_client import get_redis
+
+    return ScalableBloomFilter(get_redis())
+
+
+def rebuild_from_db() -> int:
+    from sqlalchemy import func, select
+
+    from app.database.db import sync_session_factory
+    from app.database.models import NewsItem
+
+    session = sync_session_factory()
+    try:
+        total = session.scalar(select(func.count(NewsItem.id)))
+        rows = session.execute(
+            select(NewsItem.url_hash, NewsItem.title_hash).execution_options(yield_per=5000)
+        )
+        keys = (key for url_key, title_key in rows for key in news_bloom_keys(url_key, title_key))
+        return get_news_bloom().rebuild(keys, expected_items=total * 2)
+    finally:
+        session.close()
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Фильтр Блума уже виденных новостей')
+    arg_parser.add_argument('command', choices=['rebuild', 'stats'])
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.command == 'rebuild':
+        logger.info(f'Фильтр пересобран, ключей: {rebuild_from_db()}')
+    else:
+        print(json.dumps(get_news_bloom().stats(), indent=2))
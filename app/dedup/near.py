@@ -0,0 +1,140 @@
+"""
+Поиск почти-дубликатов новостей (одна история с разных источников) по SimHash заголовка и анонса.
+
+64-битный отпечаток делится на NEAR_DUP_BANDS полос; отпечатки с расстоянием Хэмминга
+меньше числа полос обязательно совпадают хотя бы в одной полосе (принцип Дирихле).
+Для каждой полосы в Redis хранится ZSET кандидатов со временем добавления в score,
+поэтому индекс обновляется инкрементально и ограничен скользящим окном NEAR_DUP_WINDOW_HOURS.
+"""
+import logging
+import re
+from collections import Counter
+from hashlib import blake2b
+from time import time
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from redis import Redis, RedisError
+
+from app.config import settings
+from app.dedup.normalize import normalize_title
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_BITS = 64
+KEY_PREFIX = 'neardup'
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def simhash(text: str) -> int:
+    tokens = TOKEN_RE.findall(normalize_title(text))
+    # Биграммы слов устойчивее к перестановкам, униграммы нужны для коротких текстов
+    features = Counter(tokens)
+    features.update(f'{a} {b}' for a, b in zip(tokens, tokens[1:]))
+
+    weights = [0] * FINGERPRINT_BITS
+    for feature, weight in features.items():
+        feature_hash = _feature_hash(feature)
+        for bit in range(FINGERPRINT_BITS):
+            if feature_hash >> bit & 1:
+                weights[bit] += weight
+            else:
+                weights[bit] -= weight
+
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def news_fingerprint(title: str, summary: Optional[str] = None) -> int:
+    return simhash(f'{title} {(summary or "")[:settings.NEAR_DUP_SUMMARY_LENGTH]}')
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class NearDuplicateIndex:
+    def __init__(
+            self,
+            redis: Redis,
+            bands: int = settings.NEAR_DUP_BANDS,
+            max_distance: int = settings.NEAR_DUP_MAX_DISTANCE,
+            window_seconds: int = settings.NEAR_DUP_WINDOW_HOURS * 3600
+    ):
+        if max_distance >= bands:
+            raise ValueError('NEAR_DUP_MAX_DISTANCE должен быть меньше NEAR_DUP_BANDS')
+        self.redis = redis
+        self.bands = bands
+        self.band_bits = FINGERPRINT_BITS // bands
+        self.max_distance = max_distance
+        self.window_seconds = window_seconds
+
+    def _band_keys(self, fingerprint: int) -> List[str]:
+        mask = (1 << self.band_bits) - 1
+        return [
+            f'{KEY_PREFIX}:{band}:{fingerprint >> (band * self.band_bits) & mask:x}'
+            for band in range(self.bands)
+        ]
+
+    def find(self, fingerprints: Sequence[int]) -> List[Optional[str]]:
+        """Для каждого отпечатка возвращает id похожей новости из окна или None — одним запросом к Redis"""
+        min_score = time() - self.window_seconds
+        pipeline = self.redis.pipeline(transaction=False)
+        for fingerprint in fingerprints:
+            for key in self._band_keys(fingerprint):
+                pipeline.zrangebyscore(key, min_score, '+inf')
+        replies = pipeline.execute()
+
+        result = []
+        for index, fingerprint in enumerate(fingerprints):
+            match = None
+            for members in replies[index * self.bands:(index + 1) * self.bands]:
+                for member in members:
+                    candidate, _, news_id = member.decode().partition(':')
+                    if hamming_distance(fingerprint, int(candidate, 16)) <= self.max_distance:
+                        match = news_id
+                        break
+                if match:
+                    break
+            result.append(match)
+        return result
+
+    def add(self, entries: Iterable[Tuple[int, str]]) -> None:
+        now = time()
+        pipeline = self.redis.pipeline(transaction=False)
+        for fingerprint, news_id in entries:
+            member = f'{fingerprint:x}:{news_id}'
+            for key in self._band_keys(fingerprint):
+                pipeline.zadd(key, {member: now})
+                pipeline.zremrangebyscore(key, '-inf', now - self.window_seconds)
+                pipeline.expire(key, self.window_seconds)
+        pipeline.execute()
+
+
+def filter_near_duplicates(
+        index: Optional[NearDuplicateIndex],
+        fingerprints: Sequence[int]
+) -> List[bool]:
+    """
+    Отмечает почти-дубликаты среди новых новостей: и относительно индекса, и внутри самой пачки.
+    Если Redis недоступен, проверяется только пачка — парсинг не должен падать из-за кеша.
+    """
+    matches: List[Optional[str]] = [None] * len(fingerprints)
+    if index is not None:
+        try:
+            matches = index.find(fingerprints)
+        except RedisError as e:
+            logger.warning(f'Индекс почти-дубликатов недоступен: {e}')
+
+    duplicates = []
+    accepted: List[int] = []
+    for fingerprint, match in zip(fingerprints, matches):
+        is_duplicate = match is not None or any(
+            hamming_distance(fingerprint, other) <= settings.NEAR_DUP_MAX_DISTANCE for other in accepted
+        )
+        if not is_duplicate:
+            accepted.append(fingerprint)
+        duplicates.append(is_duplicate)
+    return duplicates
@@ -0,0 +1,66 @@
+"""
+Нормализация url и заголовков новостей и их хеши для уникальных индексов.
+Один и тот же материал с utm-метками, слешем в конце или другим регистром
+заголовка дает одинаковый хеш.
+"""
+import re
+import unicodedata
+from hashlib import blake2b
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'yclid', 'dclid', 'msclkid', 'mc_cid', 'mc_eid',
+    'ref', 'ref_src', 'from', '_ga', '_openstat', 'igshid', 'spm',
+}
+TRACKING_PREFIXES = ('utm_',)
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+PUNCTUATION_RE = re.compile(r'[^\w\s]', re.UNICODE)
+SPACES_RE = re.compile(r'\s+')
+
+
+def normalize_url(url: str) -> str:
+    """
+    Ключ url без схемы, www, порта по умолчанию, фрагмента, трекинговых параметров
+    и завершающего слеша; оставшиеся параметры отсортированы.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower().removeprefix('www.')
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f'{host}:{parts.port}'
+
+    path = re.sub(r'/{2,}', '/', parts.path).rstrip('/')
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+    normalized = f'{host}{path}'
+    if query:
+        normalized += '?' + urlencode(query)
+    return normalized
+
+
+def normalize_title(title: str) -> str:
+    title = unicodedata.normalize('NFKC', title).casefold().replace('ё', 'е')
+    title = PUNCTUATION_RE.sub(' ', title)
+    return SPACES_RE.sub(' ', title).strip()
+
+
+def content_hash(value: str) -> str:
+    return blake2b(value.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def url_hash(url: Optional[str]) -> Optional[str]:
+    if not url:
+        return None
+    return content_hash(normalize_url(url))
+
+
+def title_hash(title: Optional[str]) -> Optional[str]:
+    if not title:
+        return None
+    normalized = normalize_title(title)
+    return content_hash(normalized) if normalized else None
@@ -0,0 +1,142 @@
+"""
+Фильтр новостей по ключевым словам перед генерацией.
+
+Все слова и фразы из таблицы keywords собираются в один автомат Ахо-Корасик: текст новости
+проходится один раз независимо от числа ключевых слов. Если установлен pyahocorasick,
+автомат строится на нем (реализация на C), иначе используется встроенная реализация.
+
+Автомат кешируется в процессе воркера и пересобирается, когда меняется версия keywords:version
+в Redis (ее увеличивают эндпоинты ключевых слов). Пустая таблица ключевых слов фильтр отключает.
+"""
+import importlib.util
+import logging
+import re
+from typing import Iterable, List, Optional
+
+from redis import RedisError
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database.models import Keyword, NewsItem
+from app.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'keywords:version'
+SPACES_RE = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    return SPACES_RE.sub(' ', text.lower().replace('ё', 'е'))
+
+
+def news_text(news: NewsItem) -> str:
+    parts = [news.title or '', news.summary or '', (news.raw_text or '')[:settings.KEYWORD_MATCH_TEXT_LENGTH]]
+    return normalize_text(' '.join(parts))
+
+
+class KeywordMatcher:
+    """Поиск ключевых слов целыми словами: «go» не находится в «google»"""
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: List[str] = sorted({normalize_text(keyword).strip() for keyword in keywords} - {''})
+        self._automaton = None
+        if importlib.util.find_spec('ahocorasick'):
+            self._build_native()
+        else:
+            self._build()
+
+    @property
+    def empty(self) -> bool:
+        return not self.keywords
+
+    def _build_native(self):
+        import ahocorasick
+
+        self._automaton = ahocorasick.Automaton()
+        for keyword in self.keywords:
+            self._automaton.add_word(keyword, len(keyword))
+        if self.keywords:
+            self._automaton.make_automaton()
+
+    def _build(self):
+        # Бор с переходами-словарями, суффиксными ссылками и длинами слов, заканчивающихся в вершине
+        self._goto: List[dict] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for keyword in self.keywords:
+            state = 0
+            for char in keyword:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._out[state].append(len(keyword))
+
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._out[next_state] += self._out[self._fail[next_state]]
+
+    def _iter_matches(self, text: str):
+        """Пары (индекс последнего символа, длина слова) для всех вхождений"""
+        if self._automaton is not None:
+            yield from self._automaton.iter(text)
+            return
+
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length in out[state]:
+                yield end, length
+
+    def find(self, text: str, first_only: bool = False) -> List[str]:
+        found = []
+        for end, length in self._iter_matches(text):
+            start = end - length + 1
+            if start > 0 and text[start - 1].isalnum():
+                continue
+            if end + 1 < len(text) and text[end + 1].isalnum():
+                continue
+            found.append(text[start:end + 1])
+            if first_only:
+                break
+        return found
+
+    def matches(self, text: str) -> bool:
+        return bool(self.find(text, first_only=True))
+
+
+_matcher: Optional[KeywordMatcher] = None
+_matcher_version: Optional[int] = None
+
+
+def _current_version() -> Optional[int]:
+    try:
+        return int(get_redis().get(VERSION_KEY) or 0)
+    except RedisError as e:
+        logger.warning(f'Не удалось получить версию ключевых слов: {e}')
+        return None
+
+
+def get_keyword_matcher(session: Session) -> KeywordMatcher:
+    """Автомат процесса; без Redis пересобирается на каждый вызов, чтобы не работать со старыми словами"""
+    global _matcher, _matcher_version
+
+    version = _current_version()
+    if _matcher is None or version is None or version != _matcher_version:
+        _matcher = KeywordMatcher(session.scalars(select(Keyword.word)).all())
+        _matcher_version = version
+        logger.info(f'Фильтр ключевых слов собран: {len(_matcher.keywords)} слов')
+    return _matcher
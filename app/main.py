@@ -3,14 +3,14 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 from .api.endpoints import router
-from .database.db import init_db, async_engine
+from .database.db import init_db, close_async_engine
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
     yield
-    await async_engine.dispose()
+    await close_async_engine()
 
 
 app = FastAPI(
@@ -0,0 +1,2 @@
+# Модули с парсерами регистрируют их в реестре app.news_parser.sites.PARSERS при импорте
+from . import feeds  # noqa: F401
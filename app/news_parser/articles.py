@@ -0,0 +1,80 @@
+"""
+Загрузка полных текстов статей для NewsItem.raw_text.
+Страницы качаются параллельно ограниченным пулом, каждый ответ читается потоково
+не дальше ENRICH_MAX_BYTES, из HTML извлекается только текст статьи.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+from urllib.parse import urlparse
+
+import requests
+import soupsieve
+
+from app.config import settings
+from app.news_parser.html import make_soup
+from app.news_parser.http import get_http_client
+from app.news_parser.sites import PARSERS_BY_HOST
+
+logger = logging.getLogger(__name__)
+
+NOISE_TAGS = ('script', 'style', 'noscript', 'nav', 'header', 'footer', 'aside', 'form')
+
+
+class ArticleRequest(NamedTuple):
+    news_id: str
+    url: str
+    # Селектор текста статьи из Source.selectors['body'], если задан
+    selector: Optional[str] = None
+
+
+def extract_article_text(html: str, url: str, selector: Optional[str] = None) -> str:
+    host = (urlparse(url).hostname or '').removeprefix('www.')
+    parser_cls = PARSERS_BY_HOST.get(host)
+    selector = selector or (parser_cls.article_selector if parser_cls else None)
+
+    soup = make_soup(html)
+    node = soupsieve.select_one(selector, soup) if selector else None
+    if node is None:
+        for tag in soup.find_all(NOISE_TAGS):
+            tag.decompose()
+        node = soup.find('article') or soup.find('main') or soup.body or soup
+
+    text = node.get_text('\n', strip=True)
+    return text[:settings.ENRICH_MAX_TEXT_LENGTH]
+
+
+def _download(url: str) -> str:
+    # Текст статьи почти всегда в начале страницы: слишком длинный ответ обрезаем, а не отбрасываем
+    with get_http_client().stream(url, max_bytes=settings.ENRICH_MAX_BYTES, truncate=True) as stream:
+        if stream.status_code >= 400:
+            raise requests.HTTPError(f'{stream.status_code} для {url}')
+        content = b''.join(stream.chunks)
+        return content.decode(stream.encoding or 'utf-8', errors='replace')
+
+
+def fetch_article_texts(requests: List[ArticleRequest]) -> Dict[str, str]:
+    """
+    Возвращает news_id -> текст статьи. Для страниц, которые не удалось скачать,
+    возвращается пустая строка, чтобы не запрашивать их повторно.
+    """
+    host_limits: Dict[str, threading.BoundedSemaphore] = {}
+    for request in requests:
+        host = urlparse(request.url).hostname or ''
+        host_limits.setdefault(host, threading.BoundedSemaphore(settings.ENRICH_PER_HOST_LIMIT))
+
+    def fetch(request: ArticleRequest) -> str:
+        try:
+            with host_limits[urlparse(request.url).hostname or '']:
+                html = _download(request.url)
+            return extract_article_text(html, request.url, request.selector)
+        except Exception as e:
+            logger.warning(f'Не удалось получить текст статьи {request.url}: {e}')
+            return ''
+
+    if not requests:
+        return {}
+    with ThreadPoolExecutor(max_workers=settings.ENRICH_MAX_WORKERS, thread_name_prefix='enrich') as executor:
+        texts = executor.map(fetch, requests)
+        return {request.news_id: text for request, text in zip(requests, texts)}
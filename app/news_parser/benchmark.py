@@ -0,0 +1,58 @@
+"""
+Микробенчмарк движков разбора HTML на сохраненных страницах Хабра.
+Проверяет, что каждый движок дает тот же результат, что и полный html.parser.
+
+Запуск: python -m app.news_parser.benchmark [файлы...] [-n 50]
+"""
+import argparse
+import sys
+from pathlib import Path
+from time import perf_counter
+
+from app.news_parser.html import PARSER_ENGINES, resolve_engine
+from app.news_parser.sites import HabrParser
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures'
+BASELINE_ENGINE = 'html.parser'
+
+
+def run(files: list[Path], repeat: int) -> bool:
+    parser = HabrParser()
+    identical = True
+
+    for path in files:
+        html = path.read_text(encoding='utf-8')
+        expected = parser.parse_html(html, BASELINE_ENGINE)
+        print(f'{path.name}: {len(html)} байт, {len(expected)} статей')
+
+        baseline_time = None
+        for engine in PARSER_ENGINES:
+            if resolve_engine(engine) != engine:
+                print(f'  {engine:<12} пропущен: движок недоступен')
+                continue
+
+            start = perf_counter()
+            for _ in range(repeat):
+                result = parser.parse_html(html, engine)
+            elapsed = (perf_counter() - start) / repeat * 1000
+
+            if baseline_time is None:
+                baseline_time = elapsed
+            same = result == expected
+            identical &= same
+            print(
+                f'  {engine:<12} {elapsed:8.2f} мс  x{baseline_time / elapsed:5.1f}  '
+                f'{"совпадает" if same else "РЕЗУЛЬТАТ ОТЛИЧАЕТСЯ"}'
+            )
+
+    return identical
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('files', nargs='*', type=Path)
+    arg_parser.add_argument('-n', '--repeat', type=int, default=50)
+    args = arg_parser.parse_args()
+
+    fixtures = args.files or sorted(FIXTURES_DIR.glob('habr*.html'))
+    sys.exit(0 if run(fixtures, args.repeat) else 1)
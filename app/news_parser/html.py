@@ -0,0 +1,42 @@
+"""
+Выбор движка разбора HTML для парсеров сайтов.
+
+- html.parser — полное дерево на чистом Python (самый медленный вариант);
+- strainer — html.parser, но строится только нужный фрагмент страницы (SoupStrainer);
+- lxml — C-парсер lxml вместе с SoupStrainer (если lxml не установлен, используется strainer).
+"""
+import importlib.util
+import logging
+from typing import Optional
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+PARSER_ENGINES = ('html.parser', 'strainer', 'lxml')
+
+_lxml_available = importlib.util.find_spec('lxml') is not None
+
+
+def resolve_engine(engine: Optional[str] = None) -> str:
+    engine = engine or settings.PARSER_ENGINE
+    if engine not in PARSER_ENGINES:
+        raise ValueError(f'Неизвестный движок парсинга HTML: {engine}')
+    if engine == 'lxml' and not _lxml_available:
+        logger.warning('lxml не установлен, используем strainer')
+        return 'strainer'
+    return engine
+
+
+def make_soup(markup: str | bytes, engine: Optional[str] = None, only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+    """
+    Строит дерево документа выбранным движком.
+    only ограничивает дерево нужным фрагментом для движков strainer и lxml.
+    """
+    engine = resolve_engine(engine)
+    if engine == 'html.parser':
+        return BeautifulSoup(markup, 'html.parser')
+    builder = 'lxml' if engine == 'lxml' else 'html.parser'
+    return BeautifulSoup(markup, builder, parse_only=only)
@@ -0,0 +1,277 @@
+"""
+Общий HTTP-клиент для парсеров: пул соединений с keep-alive, таймауты,
+опциональный HTTP/2 (через httpx), распаковка gzip/brotli, ограничение размера ответа
+и статистика по хостам.
+"""
+import importlib.util
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from time import perf_counter
+from typing import Iterator, Mapping, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _accept_encoding() -> str:
+    # br объявляем только если установлен декодер, иначе сервер пришлет то, что мы не распакуем
+    encodings = ['gzip', 'deflate']
+    if importlib.util.find_spec('brotli') or importlib.util.find_spec('brotlicffi'):
+        encodings.append('br')
+    return ', '.join(encodings)
+
+
+class ResponseTooLarge(Exception):
+    pass
+
+
+@dataclass
+class HostStats:
+    requests: int = 0
+    connections_reused: int = 0
+    not_modified: int = 0
+    http_errors: int = 0
+    bytes_downloaded: int = 0
+    ttfb_total: float = 0.0
+    ttfb_max: float = 0.0
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        data['ttfb_avg'] = self.ttfb_total / self.requests if self.requests else 0.0
+        return data
+
+
+@dataclass
+class HttpStream:
+    url: str
+    status_code: int
+    headers: Mapping[str, str]
+    encoding: Optional[str]
+    chunks: Iterator[bytes]
+
+
+@dataclass
+class HttpResponse:
+    url: str
+    status_code: int
+    headers: Mapping[str, str]
+    encoding: Optional[str]
+    content: bytes
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code} для {self.url}')
+
+
+class HttpClient:
+    def __init__(
+            self,
+            connect_timeout: float = settings.HTTP_CONNECT_TIMEOUT,
+            read_timeout: float = settings.HTTP_READ_TIMEOUT,
+            max_response_bytes: int = settings.HTTP_MAX_RESPONSE_BYTES,
+            pool_maxsize: int = settings.HTTP_POOL_MAXSIZE,
+            http2: bool = settings.HTTP_HTTP2,
+            user_agent: str = settings.HTTP_USER_AGENT
+    ):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_response_bytes = max_response_bytes
+        self.default_headers = {
+            'User-Agent': user_agent,
+            'Accept-Encoding': _accept_encoding(),
+        }
+        self._stats: dict[str, HostStats] = {}
+        self._lock = threading.Lock()
+
+        self._httpx_client = None
+        if http2:
+            if importlib.util.find_spec('h2') and importlib.util.find_spec('httpx'):
+                import httpx
+                self._httpx_client = httpx.Client(
+                    http2=True,
+                    timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                    limits=httpx.Limits(max_keepalive_connections=pool_maxsize),
+                    headers=self.default_headers,
+                    follow_redirects=True
+                )
+            else:
+                logger.warning('HTTP/2 включен, но httpx[http2] не установлен: используем HTTP/1.1')
+
+        self._session = requests.Session()
+        self._session.headers.update(self.default_headers)
+        adapter = HTTPAdapter(pool_connections=settings.HTTP_POOL_CONNECTIONS, pool_maxsize=pool_maxsize)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def _host_stats(self, url: str) -> HostStats:
+        return self._stats.setdefault(urlparse(url).hostname or '', HostStats())
+
+    def _record_response(self, url: str, status_code: int, reused: bool, ttfb: float):
+        # Считаем запрос сразу по заголовкам: тело 304, ошибок и слишком больших ответов никто не читает
+        with self._lock:
+            stats = self._host_stats(url)
+            stats.requests += 1
+            stats.connections_reused += int(reused)
+            stats.not_modified += int(status_code == 304)
+            stats.http_errors += int(status_code >= 400)
+            stats.ttfb_total += ttfb
+            stats.ttfb_max = max(stats.ttfb_max, ttfb)
+
+    def _record_bytes(self, url: str, size: int):
+        with self._lock:
+            self._host_stats(url).bytes_downloaded += size
+
+    def _capped(
+            self,
+            url: str,
+            chunks: Iterator[bytes],
+            max_bytes: int,
+            truncate: bool
+    ) -> Iterator[bytes]:
+        size = 0
+        try:
+            for chunk in chunks:
+                if size + len(chunk) > max_bytes:
+                    if not truncate:
+                        raise ResponseTooLarge(f'Ответ {url} больше {max_bytes} байт')
+                    chunk = chunk[:max_bytes - size]
+                    size += len(chunk)
+                    yield chunk
+                    return
+                size += len(chunk)
+                yield chunk
+        finally:
+            self._record_bytes(url, size)
+
+    @contextmanager
+    def stream(
+            self,
+            url: str,
+            headers: Optional[Mapping[str, str]] = None,
+            max_bytes: Optional[int] = None,
+            truncate: bool = False
+    ) -> Iterator[HttpStream]:
+        """
+        Потоковый ответ. max_bytes переопределяет общий лимит размера для этого запроса;
+        с truncate=True ответ обрезается по лимиту вместо ResponseTooLarge.
+        """
+        max_bytes = max_bytes or self.max_response_bytes
+        if self._httpx_client is not None:
+            with self._stream_httpx(url, headers, max_bytes, truncate) as stream:
+                yield stream
+            return
+
+        start = perf_counter()
+        response = self._session.get(url, headers=headers, timeout=self.timeout, stream=True)
+        ttfb = perf_counter() - start
+        try:
+            # Помечаем соединение urllib3: если метка уже есть, значит оно пришло из пула
+            connection = getattr(response.raw, 'connection', None) or getattr(response.raw, '_connection', None)
+            reused = bool(getattr(connection, '_aibot_used', False))
+            if connection is not None:
+                connection._aibot_used = True
+            self._record_response(url, response.status_code, reused, ttfb)
+
+            if not truncate:
+                self._check_length(url, response.headers, max_bytes)
+            yield HttpStream(
+                url=response.url,
+                status_code=response.status_code,
+                headers=response.headers,
+                encoding=response.encoding,
+                chunks=self._capped(url, response.iter_content(CHUNK_SIZE), max_bytes, truncate)
+            )
+        finally:
+            response.close()
+
+    @contextmanager
+    def _stream_httpx(
+            self,
+            url: str,
+            headers: Optional[Mapping[str, str]],
+            max_bytes: int,
+            truncate: bool
+    ) -> Iterator[HttpStream]:
+        connected = []
+
+        def trace(event_name: str, info: dict):
+            if event_name == 'connection.connect_tcp.started':
+                connected.append(True)
+
+        start = perf_counter()
+        with self._httpx_client.stream('GET', url, headers=headers, extensions={'trace': trace}) as response:
+            ttfb = perf_counter() - start
+            self._record_response(url, response.status_code, not connected, ttfb)
+            if not truncate:
+                self._check_length(url, response.headers, max_bytes)
+            yield HttpStream(
+                url=str(response.url),
+                status_code=response.status_code,
+                headers=response.headers,
+                encoding=response.charset_encoding,
+                chunks=self._capped(url, response.iter_bytes(CHUNK_SIZE), max_bytes, truncate)
+            )
+
+    @staticmethod
+    def _check_length(url: str, headers: Mapping[str, str], max_bytes: int):
+        length = headers.get('Content-Length')
+        if length and length.isdigit() and int(length) > max_bytes:
+            raise ResponseTooLarge(f'Ответ {url} больше {max_bytes} байт')
+
+    def get(
+            self,
+            url: str,
+            headers: Optional[Mapping[str, str]] = None,
+            max_bytes: Optional[int] = None
+    ) -> HttpResponse:
+        with self.stream(url, headers, max_bytes) as stream:
+            content = b''.join(stream.chunks)
+            return HttpResponse(
+                url=stream.url,
+                status_code=stream.status_code,
+                headers=stream.headers,
+                encoding=stream.encoding,
+                content=content
+            )
+
+    def stats(self, reset: bool = False) -> dict[str, dict]:
+        """Счетчики по хостам; с reset=True обнуляются, чтобы следующий вызов вернул данные только за новый период"""
+        with self._lock:
+            result = {host: stats.as_dict() for host, stats in self._stats.items()}
+            if reset:
+                self._stats = {}
+            return result
+
+    def close(self):
+        self._session.close()
+        if self._httpx_client is not None:
+            self._httpx_client.close()
+
+
+_client: HttpClient | None = None
+_client_pid: int | None = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """Один клиент на процесс: после fork дочерний процесс создает свой пул соединений"""
+    global _client, _client_pid
+
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = HttpClient()
+            _client_pid = os.getpid()
+        return _client
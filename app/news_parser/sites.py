@@ -1,35 +1,180 @@
 from abc import ABC
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import lru_cache
 from pprint import pprint
+from typing import Any, Dict, List, NamedTuple, Optional, Type
+from urllib.parse import urljoin, urlparse
 
-import requests
-from bs4 import BeautifulSoup
+import soupsieve
+from bs4 import SoupStrainer
+
+from app.config import settings
+from app.database.types import SourceType
+from app.news_parser.html import make_soup
+from app.news_parser.http import get_http_client, HttpResponse
+
+ARTICLES_LIST_STRAINER = SoupStrainer('div', class_='tm-articles-list')
+
+# Реестр парсеров: по имени (Source.parser) и по хосту Source.url
+PARSERS: Dict[str, Type['SiteParser']] = {}
+PARSERS_BY_HOST: Dict[str, Type['SiteParser']] = {}
+
+
+def register_parser(name: str, hosts: tuple[str, ...] = ()):
+    def decorator(cls: Type['SiteParser']) -> Type['SiteParser']:
+        PARSERS[name] = cls
+        for host in hosts:
+            PARSERS_BY_HOST[host] = cls
+        return cls
+    return decorator
+
+
+def get_parser_class(source) -> Optional[Type['SiteParser']]:
+    if source.parser:
+        return PARSERS.get(source.parser)
+    if source.type == SourceType.RSS:
+        return PARSERS.get('feed')
+    if source.selectors:
+        return SelectorParser
+    host = urlparse(source.url or '').hostname or ''
+    return PARSERS_BY_HOST.get(host.removeprefix('www.')) or PARSERS.get((source.name or '').lower())
+
+
+def to_utc_naive(value: datetime) -> datetime:
+    """Приводит дату к naive UTC, чтобы сравнивать даты с сайтов с курсором из БД"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
 
 
 class SiteParser(ABC):
-    def __init__(self, url: str, articles_path: str = ''):
+    # CSS-селектор текста статьи на ее собственной странице (для обогащения raw_text)
+    article_selector: Optional[str] = None
+
+    def __init__(
+            self,
+            url: str,
+            articles_path: str = '',
+            etag: Optional[str] = None,
+            last_modified: Optional[str] = None,
+            since: Optional[datetime] = None,
+            max_pages: Optional[int] = None
+    ):
         self.base_url = url
         self.articles_path = articles_path
+        # Валидаторы для условного GET; после запроса обновляются значениями из ответа
+        self.etag = etag
+        self.last_modified = last_modified
+        # Курсор: дата самой свежей новости прошлого запуска, более старые статьи не возвращаем
+        self.since = since
+        self.max_pages = max_pages or settings.PARSE_MAX_PAGES
+
+    @classmethod
+    def from_source(cls, source) -> 'SiteParser':
+        """Создает парсер по настройкам источника (строки Source)"""
+        raise NotImplementedError
+
+    @staticmethod
+    def _state_from_source(source) -> Dict[str, Any]:
+        return {
+            'etag': source.http_etag,
+            'last_modified': source.http_last_modified,
+            'since': source.cursor_published_at,
+        }
+
+    def parse(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Возвращает новости новее курсора или None, если первая страница не изменилась (304).
+        Следующие страницы запрашиваются, только если вся страница оказалась новой,
+        то есть с прошлого запуска вышло больше одной страницы статей.
+        """
+        result = []
+        url = self._first_page_url()
+        for page in range(1, self.max_pages + 1):
+            response = self._fetch(url, conditional=page == 1)
+            if response is None:
+                return None
+
+            items = self.parse_html(response.text)
+            fresh = self._take_new(items)
+            result.extend(fresh)
+
+            if self.since is None or not items or len(fresh) < len(items):
+                break
+            url = self._next_page_url(page + 1)
+            if not url:
+                break
 
-    def parse(self):
+        return result
+
+    def parse_html(self, html: str, engine: Optional[str] = None) -> List[Dict[str, Any]]:
         raise NotImplementedError
 
+    def _first_page_url(self) -> str:
+        return self._normalize_url()
+
+    def _next_page_url(self, page: int) -> Optional[str]:
+        return None
+
+    def _take_new(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if self.since is None:
+            return items
+        fresh = []
+        for item in items:
+            published_at = item.get('published_at')
+            # Статьи идут от новых к старым: первая старше курсора означает, что дальше только старые.
+            # Статьи с временем, равным курсору, берем: даты бывают с точностью до минуты, а уже
+            # сохраненную граничную статью отсечет уникальный индекс по хешу url/заголовка
+            if published_at is not None and to_utc_naive(published_at) < self.since:
+                break
+            fresh.append(item)
+        return fresh
+
+    def _conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def _remember_validators(self, headers) -> None:
+        self.etag = headers.get('ETag')
+        self.last_modified = headers.get('Last-Modified')
+
+    def _fetch(self, url: str, conditional: bool = False) -> Optional[HttpResponse]:
+        headers = self._conditional_headers() if conditional else {}
+        response = get_http_client().get(url, headers=headers)
+        if conditional and response.status_code == 304:
+            return None
+        response.raise_for_status()
+
+        if conditional:
+            self._remember_validators(response.headers)
+        return response
+
     def _normalize_url(self, url: str = ''):
         return self.base_url + self.articles_path + url
 
 
+@register_parser('habr', hosts=('habr.com',))
 class HabrParser(SiteParser):
-    def __init__(self):
-        super().__init__('https://habr.com/', 'ru/articles/')
+    article_selector = '#post-content-body, div.article-formatted-body'
+
+    def __init__(self, **state):
+        super().__init__('https://habr.com/', 'ru/articles/', **state)
         self.source = 'habr'
 
-    def parse(self):
-        response = requests.get(self._normalize_url(), headers={
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:146.0) Gecko/20100101 Firefox/146.0'
-        })
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
+    @classmethod
+    def from_source(cls, source) -> 'HabrParser':
+        return cls(**cls._state_from_source(source))
+
+    def _next_page_url(self, page: int) -> Optional[str]:
+        return self._normalize_url(f'page{page}/')
+
+    def parse_html(self, html: str, engine: Optional[str] = None) -> List[Dict[str, Any]]:
+        soup = make_soup(html, engine, only=ARTICLES_LIST_STRAINER)
+
         articles_list = soup.find('div', class_='tm-articles-list')
         if not articles_list:
             return []
@@ -74,5 +219,115 @@ class HabrParser(SiteParser):
         
         return result
 
+
+SELECTOR_KEYS = ('list', 'title', 'url', 'summary', 'time', 'next', 'body')
+REQUIRED_SELECTOR_KEYS = ('list', 'title')
+
+
+class CompiledSelectors(NamedTuple):
+    list: soupsieve.SoupSieve
+    title: soupsieve.SoupSieve
+    url: Optional[soupsieve.SoupSieve]
+    summary: Optional[soupsieve.SoupSieve]
+    time: Optional[soupsieve.SoupSieve]
+    next: Optional[soupsieve.SoupSieve]
+    body: Optional[soupsieve.SoupSieve]
+
+
+@lru_cache(maxsize=1024)
+def _compile_selectors(items: tuple[tuple[str, str], ...]) -> CompiledSelectors:
+    selectors = dict(items)
+    return CompiledSelectors(**{
+        key: soupsieve.compile(selectors[key]) if selectors.get(key) else None
+        for key in SELECTOR_KEYS
+    })
+
+
+def compile_selectors(selectors: Dict[str, str]) -> CompiledSelectors:
+    """
+    Компилирует CSS-селекторы источника. Результат кешируется на процесс,
+    поэтому повторные запуски парсинга не платят за разбор селекторов.
+    Селекторы title/url/summary/time ищутся внутри элемента list,
+    next — ссылка на следующую страницу списка, body — текст статьи на ее странице.
+    """
+    missing = [key for key in REQUIRED_SELECTOR_KEYS if not selectors.get(key)]
+    if missing:
+        raise ValueError(f'Не заданы обязательные селекторы: {", ".join(missing)}')
+    unknown = set(selectors) - set(SELECTOR_KEYS)
+    if unknown:
+        raise ValueError(f'Неизвестные селекторы: {", ".join(sorted(unknown))}')
+    return _compile_selectors(tuple(sorted(selectors.items())))
+
+
+@register_parser('selectors')
+class SelectorParser(SiteParser):
+    """Универсальный парсер страницы со списком статей по CSS-селекторам из Source.selectors"""
+
+    def __init__(
+            self,
+            url: str,
+            selectors: Dict[str, str],
+            source: str,
+            **state
+    ):
+        super().__init__(url, **state)
+        self.selectors = compile_selectors(selectors)
+        self.source = source
+        self._next_url: Optional[str] = None
+
+    @classmethod
+    def from_source(cls, source) -> 'SelectorParser':
+        return cls(source.url, source.selectors or {}, source.name, **cls._state_from_source(source))
+
+    def _next_page_url(self, page: int) -> Optional[str]:
+        return self._next_url
+
+    def parse_html(self, html: str, engine: Optional[str] = None) -> List[Dict[str, Any]]:
+        soup = make_soup(html, engine)
+        selectors = self.selectors
+
+        next_elem = selectors.next.select_one(soup) if selectors.next else None
+        self._next_url = urljoin(self.base_url, next_elem['href']) if next_elem and next_elem.get('href') else None
+
+        result = []
+        for article in selectors.list.select(soup):
+            try:
+                title_elem = selectors.title.select_one(article)
+                title = title_elem.get_text(strip=True) if title_elem else None
+                if not title:
+                    continue
+
+                url = None
+                if selectors.url:
+                    url_elem = selectors.url.select_one(article)
+                else:
+                    url_elem = title_elem if title_elem.name == 'a' else title_elem.find_parent('a')
+                if url_elem is not None and url_elem.get('href'):
+                    url = urljoin(self.base_url, url_elem['href'])
+
+                summary_elem = selectors.summary.select_one(article) if selectors.summary else None
+                summary = summary_elem.get_text(' ', strip=True) if summary_elem else ''
+
+                item = {
+                    'title': title,
+                    'url': url,
+                    'summary': summary,
+                    'source': self.source,
+                }
+
+                time_elem = selectors.time.select_one(article) if selectors.time else None
+                if time_elem is not None:
+                    item['published_at'] = datetime.fromisoformat(
+                        time_elem.get('datetime') or time_elem.get_text(strip=True)
+                    )
+
+                result.append(item)
+            except Exception:
+                # Пропускаем статьи с ошибками парсинга
+                continue
+
+        return result
+
+
 if __name__ == '__main__':
     pprint(HabrParser().parse())
@@ -0,0 +1,141 @@
+"""
+Чтение новостей из Telegram-каналов через Telethon.
+
+На процесс воркера держится одно подключение: клиент живет в отдельном потоке
+со своим event loop, поэтому синхронные задачи Celery не переподключаются на каждый канал.
+Каналы одного запуска читаются параллельно, новые сообщения забираются пачками от min_id.
+"""
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from telethon import TelegramClient
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+TITLE_MAX_LENGTH = 200
+
+
+@dataclass
+class ChannelRequest:
+    source_id: str
+    source_name: str
+    channel: str
+    min_id: Optional[int] = None
+
+
+@dataclass
+class TelegramFetchResult:
+    news_items: List[Dict[str, Any]] = field(default_factory=list)
+    # id самого свежего прочитанного сообщения — новый курсор источника
+    max_id: Optional[int] = None
+
+
+def channel_from_source(url: Optional[str], name: str) -> str:
+    channel = (url or name).strip()
+    for prefix in ('https://t.me/', 'http://t.me/', 't.me/', '@'):
+        if channel.startswith(prefix):
+            channel = channel[len(prefix):]
+    return channel.strip('/')
+
+
+def _message_to_item(message, channel: str, source_name: str) -> Optional[Dict[str, Any]]:
+    text = (message.message or '').strip()
+    if not text:
+        return None
+    title = text.split('\n', 1)[0].strip()[:TITLE_MAX_LENGTH]
+    username = getattr(message.chat, 'username', None) or channel
+    return {
+        'title': title,
+        'url': f'https://t.me/{username}/{message.id}',
+        'summary': text,
+        # Сообщение и есть полный текст: загружать страницу не нужно
+        'raw_text': text,
+        'source': source_name,
+        'published_at': message.date,
+    }
+
+
+class TelegramChannelReader:
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='telegram-reader', daemon=True)
+        self._thread.start()
+        self._client: TelegramClient | None = None
+
+    def submit(self, requests: List[ChannelRequest]) -> Future:
+        """Запускает чтение каналов в фоне; результат — словарь source_id -> TelegramFetchResult | Exception"""
+        return asyncio.run_coroutine_threadsafe(self._fetch_all(requests), self._loop)
+
+    async def _get_client(self) -> TelegramClient:
+        if self._client is None:
+            if not settings.TELERGAM_API_ID or not settings.TELERGAM_API_HASH:
+                raise RuntimeError('Telegram credentials not set')
+            self._client = TelegramClient(
+                settings.TELERGAM_READER_SESSION_NAME,
+                settings.TELERGAM_API_ID,
+                settings.TELERGAM_API_HASH
+            )
+        if not self._client.is_connected():
+            await self._client.connect()
+            if not await self._client.is_user_authorized():
+                raise RuntimeError(
+                    'Telegram reader session not authorized. '
+                    'Use python -m app.telegram.auth --reader or /api/telegram/authorize/ with reader=true'
+                )
+        return self._client
+
+    async def _fetch_all(self, requests: List[ChannelRequest]) -> Dict[str, TelegramFetchResult | Exception]:
+        client = await self._get_client()
+        semaphore = asyncio.Semaphore(settings.TG_PARSE_CONCURRENCY)
+
+        async def fetch_one(request: ChannelRequest) -> TelegramFetchResult:
+            async with semaphore:
+                return await self._fetch_channel(client, request)
+
+        results = await asyncio.gather(*(fetch_one(request) for request in requests), return_exceptions=True)
+        return {request.source_id: result for request, result in zip(requests, results)}
+
+    async def _fetch_channel(self, client: TelegramClient, request: ChannelRequest) -> TelegramFetchResult:
+        result = TelegramFetchResult(max_id=request.min_id)
+        if request.min_id:
+            # От курсора вперед: Telethon сам запрашивает историю пачками по 100 сообщений
+            messages = client.iter_messages(
+                request.channel,
+                min_id=request.min_id,
+                reverse=True,
+                limit=settings.TG_MAX_MESSAGES_PER_RUN
+            )
+        else:
+            # Первый запуск: только последние сообщения, без всей истории канала
+            messages = client.iter_messages(request.channel, limit=settings.TG_INITIAL_MESSAGES)
+
+        async for message in messages:
+            result.max_id = max(result.max_id or 0, message.id)
+            item = _message_to_item(message, request.channel, request.source_name)
+            if item:
+                result.news_items.append(item)
+
+        logger.info(f"Telegram '{request.source_name}': новых сообщений {len(result.news_items)}")
+        return result
+
+
+_reader: TelegramChannelReader | None = None
+_reader_pid: int | None = None
+_reader_lock = threading.Lock()
+
+
+def get_telegram_reader() -> TelegramChannelReader:
+    global _reader, _reader_pid
+
+    with _reader_lock:
+        if _reader is None or _reader_pid != os.getpid():
+            _reader = TelegramChannelReader()
+            _reader_pid = os.getpid()
+        return _reader
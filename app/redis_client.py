@@ -0,0 +1,42 @@
+import logging
+
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_redis: Redis | None = None
+
+
+def get_redis() -> Redis:
+    """
+    Общий клиент Redis процесса. Пул соединений redis-py сам пересоздается после fork,
+    поэтому клиент можно создавать лениво и переиспользовать в воркерах Celery.
+    """
+    global _redis
+
+    if _redis is None:
+        _redis = Redis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT
+        )
+    return _redis
+
+
+_async_redis: AsyncRedis | None = None
+
+
+def get_async_redis() -> AsyncRedis:
+    """Асинхронный клиент Redis для API; соединения пула открываются в event loop приложения"""
+    global _async_redis
+
+    if _async_redis is None:
+        _async_redis = AsyncRedis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT
+        )
+    return _async_redis
@@ -1,14 +1,33 @@
 import asyncio
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Tuple
 
-from app.ai.generator import generate_posts
+from sqlalchemy import func, select, tuple_, update
+
+from app.ai import openai_client
+from app.ai.batch import poll_batches, submit_batch
+from app.ai.generator import PostGenerator
+from app.ai.retry import RateLimited
+from app.api.cache import invalidate as invalidate_cache
+from app.config import settings
 from app.database import NewsItem, PostStatus
-from app.database.db import get_db_sync
-from app.database.models import Source, Post
+from app.database.db import get_db_sync, get_sync_engine
+from app.database.retention import apply_retention
+from app.database.models import GenerationBatch, Source, Post
 from app.database.types import SourceType
+from app.keyword_filter import get_keyword_matcher, news_text
+from app.news_parser.articles import ArticleRequest, fetch_article_texts
+from app.news_parser.http import get_http_client
 from app.telegram.publisher import publish_post
-from app.utils import parse_site_source, parse_telegram_source
+from app.utils import (
+    SITE_SOURCE_TYPES,
+    collect_telegram_results,
+    fetch_site_sources,
+    fetch_telegram_sources,
+    store_site_fetch_result,
+    store_telegram_fetch_result
+)
 from celery_worker import celery_app
 
 logger = logging.getLogger(__name__)
@@ -34,7 +53,17 @@ def parse_news(self):
                 return {'status': 'success', 'saved': 0, 'sources_processed': 0}
 
             logger.info(f"Найдено активных источников: {len(sources)}")
+            # Клиент HTTP живет весь процесс воркера: обнуляем счетчики, чтобы отчитаться только за этот запуск
+            get_http_client().stats(reset=True)
+
+            # Фаза загрузки: все сайты скачиваются параллельно, время цикла ~ самый медленный источник
+            site_sources = [source for source in sources if source.type in SITE_SOURCE_TYPES]
+            tg_sources = [source for source in sources if source.type == SourceType.TG]
+            telegram_fetch = fetch_telegram_sources(tg_sources)
+            fetched = fetch_site_sources(site_sources)
+            fetched.update(collect_telegram_results(telegram_fetch, tg_sources))
 
+            # Фаза сохранения: последовательно, в одной сессии
             total_saved = 0
             for source in sources:
                 # Сохраняем имя источника до обработки, чтобы избежать проблем с rollback
@@ -42,10 +71,16 @@ def parse_news(self):
                 try:
                     source_type = source.type
 
-                    if source_type == SourceType.SITE:
-                        saved = parse_site_source(session, source)
+                    if source_type in SITE_SOURCE_TYPES:
+                        fetch_result = fetched.get(source.id)
+                        if fetch_result is None or isinstance(fetch_result, Exception):
+                            continue
+                        saved = store_site_fetch_result(session, source, fetch_result)
                     elif source_type == SourceType.TG:
-                        saved = parse_telegram_source(session, source)
+                        fetch_result = fetched.get(source.id)
+                        if fetch_result is None or isinstance(fetch_result, Exception):
+                            continue
+                        saved = store_telegram_fetch_result(session, source, fetch_result)
                     else:
                         logger.warning(f"Неизвестный тип источника: {source_type} для '{source_name}'")
                         saved = 0
@@ -59,16 +94,30 @@ def parse_news(self):
 
             logger.info(f'Парсинг завершен. Всего сохранено новостей: {total_saved}')
 
+            http_stats = get_http_client().stats(reset=True)
+            for host, stats in http_stats.items():
+                logger.info(
+                    f"HTTP {host}: запросов {stats['requests']}, переиспользовано соединений "
+                    f"{stats['connections_reused']}, 304 — {stats['not_modified']}, ошибок {stats['http_errors']}, "
+                    f"скачано {stats['bytes_downloaded']} байт, "
+                    f"TTFB средний {stats['ttfb_avg']:.3f}с"
+                )
+
             result = {
                 'status': 'success',
                 'saved': total_saved,
-                'sources_processed': len(sources)
+                'sources_processed': len(sources),
+                'http_stats': http_stats
             }
 
-            # Автоматически запускаем генерацию постов после успешного парсинга
+            # Автоматически запускаем следующий этап после успешного парсинга
             if total_saved > 0:
-                logger.info(f'Запускаем генерацию постов для {total_saved} новых новостей')
-                generate_posts_task.delay()
+                if settings.ENRICH_ENABLED:
+                    logger.info(f'Запускаем загрузку текстов для {total_saved} новых новостей')
+                    enrich_news_task.delay()
+                else:
+                    logger.info(f'Запускаем генерацию постов для {total_saved} новых новостей')
+                    generate_posts_task.delay()
 
             return result
         except Exception as e:
@@ -86,6 +135,144 @@ def parse_news(self):
         raise self.retry(exc=e, countdown=60)
 
 
+@celery_app.task(name='app.tasks.enrich_news', bind=True, max_retries=3)
+def enrich_news_task(self):
+    """
+    Загружает полные тексты свежих новостей (NewsItem.raw_text) отдельным этапом,
+    чтобы не замедлять парсинг, и затем запускает генерацию постов.
+    """
+    logger.info('Начинаем загрузку текстов статей')
+    try:
+        db_gen = get_db_sync()
+        session = next(db_gen)
+        try:
+            since = datetime.now() - timedelta(hours=settings.ENRICH_MAX_AGE_HOURS)
+            rows = session.execute(
+                select(NewsItem.id, NewsItem.url, NewsItem.source)
+                .where(NewsItem.raw_text.is_(None), NewsItem.url.is_not(None), NewsItem.created_at >= since)
+                .order_by(NewsItem.created_at.desc())
+                .limit(settings.ENRICH_BATCH_SIZE)
+            ).all()
+
+            enriched = 0
+            if rows:
+                body_selectors = {
+                    name: (selectors or {}).get('body')
+                    for name, selectors in session.execute(select(Source.name, Source.selectors))
+                }
+                texts = fetch_article_texts([
+                    ArticleRequest(news_id, url, body_selectors.get(source_name))
+                    for news_id, url, source_name in rows
+                ])
+                # Пустая строка помечает неудачную загрузку, чтобы не повторять ее в следующий раз
+                session.execute(update(NewsItem), [
+                    {'id': news_id, 'raw_text': text} for news_id, text in texts.items()
+                ])
+                session.commit()
+                enriched = sum(1 for text in texts.values() if text)
+                logger.info(f'Загружено текстов статей: {enriched} из {len(rows)}')
+            else:
+                logger.info('Нет новостей для загрузки текстов')
+
+            generate_posts_task.delay()
+            return {'status': 'success', 'enriched': enriched}
+        except Exception as e:
+            logger.error(f'Ошибка при загрузке текстов статей: {e}', exc_info=True)
+            session.rollback()
+            raise
+        finally:
+            try:
+                next(db_gen)
+            except StopIteration:
+                pass
+
+    except Exception as e:
+        logger.error(f'Критическая ошибка при загрузке текстов статей: {e}', exc_info=True)
+        raise self.retry(exc=e, countdown=60)
+
+
+def _iter_post_batches(session, status: PostStatus, batch_size: int) -> Iterator[List[Post]]:
+    """
+    Выдает посты со статусом status упорядоченными пачками по частичному индексу очереди.
+    На Postgres строки пачки блокируются с SKIP LOCKED, так что параллельные воркеры берут разные посты;
+    блокировка держится до коммита пачки. Курсор по (created_at, id) не дает повторно выбрать посты,
+    оставшиеся в том же статусе.
+    """
+    # Нижняя граница по created_at оставляет в плане только партиции окна QUEUE_SCAN_DAYS;
+    # посты старше окна не обрабатываются (их удалит apply_retention)
+    oldest = datetime.now() - timedelta(days=settings.QUEUE_SCAN_DAYS)
+    last_created_at = last_id = None
+    while True:
+        query = (
+            select(Post)
+            .where(Post.status == status, Post.created_at >= oldest)
+            .order_by(Post.created_at, Post.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        if last_id is not None:
+            query = query.where(tuple_(Post.created_at, Post.id) > tuple_(last_created_at, last_id))
+        posts = list(session.scalars(query))
+        if not posts:
+            return
+        last_created_at, last_id = posts[-1].created_at, posts[-1].id
+        yield posts
+        if len(posts) < batch_size:
+            return
+
+
+def _select_for_generation(session, matcher, posts: List[Post]) -> Tuple[List[Post], Dict[str, NewsItem], int]:
+    """
+    Отсекает посты, новости которых не проходят фильтр ключевых слов, одним UPDATE в статус skipped.
+    Возвращает посты для генерации, их новости по id и число пропущенных.
+    """
+    news_by_id = {
+        news_item.id: news_item
+        for news_item in session.scalars(select(NewsItem).where(NewsItem.id.in_({post.news_id for post in posts})))
+    }
+
+    skipped_ids = set()
+    if not matcher.empty:
+        skipped_ids = {
+            post.id for post in posts
+            if post.news_id in news_by_id and not matcher.matches(news_text(news_by_id[post.news_id]))
+        }
+    if skipped_ids:
+        session.execute(update(Post).where(Post.id.in_(skipped_ids)).values(status=PostStatus.SKIPPED))
+
+    pending = []
+    for post in posts:
+        if post.id in skipped_ids:
+            continue
+        if post.news_id not in news_by_id:
+            logger.warning(f'Новость с id {post.news_id} не найдена')
+            continue
+        pending.append(post)
+    return pending, news_by_id, len(skipped_ids)
+
+
+def _batch_backlog(session) -> bool:
+    """Очередь new достаточно велика, чтобы отправить ее в Batch API"""
+    if not settings.BATCH_GENERATION_ENABLED:
+        return False
+    oldest = datetime.now() - timedelta(days=settings.QUEUE_SCAN_DAYS)
+    backlog = session.scalar(
+        select(func.count()).select_from(
+            select(Post.id)
+            .where(Post.status == PostStatus.NEW, Post.created_at >= oldest)
+            .limit(settings.BATCH_MIN_POSTS)
+            .subquery()
+        )
+    )
+    return backlog >= settings.BATCH_MIN_POSTS
+
+
+def _openai_client():
+    if openai_client.client is None:
+        raise ValueError('OPENAI_API_KEY is not set')
+    return openai_client.client
+
+
 @celery_app.task(name='app.tasks.generate_posts', bind=True, max_retries=3)
 def generate_posts_task(self):
     logger.info('Выполняем задачу генерации постов по новости')
@@ -93,53 +280,79 @@ def generate_posts_task(self):
         db_gen = get_db_sync()
         session = next(db_gen)
 
+        generator = None
         try:
-            # Находим посты со статусом NEW и получаем связанные новости
-            posts = session.query(Post).filter(Post.status == PostStatus.NEW).all()
-            if not posts:
+            if _batch_backlog(session):
+                logger.info('Большая очередь постов: генерация через Batch API')
+                submit_generation_batch_task.delay()
+                return {'status': 'batched', 'generated': 0, 'skipped': 0, 'deferred': 0}
+
+            generated_count = skipped_count = deferred_count = claimed = 0
+            matcher = get_keyword_matcher(session)
+            for posts in _iter_post_batches(session, PostStatus.NEW, settings.GENERATE_BATCH_SIZE):
+                claimed += len(posts)
+                # Новости без ключевых слов отсекаем до обращения к OpenAI
+                pending, news_by_id, skipped = _select_for_generation(session, matcher, posts)
+                skipped_count += skipped
+
+                if pending:
+                    # Клиент OpenAI и лимитер создаются один раз на запуск, когда есть что генерировать
+                    generator = generator or PostGenerator()
+                    texts = generator.generate([news_by_id[post.news_id] for post in pending])
+                    for post, post_text in zip(pending, texts):
+                        if isinstance(post_text, RateLimited):
+                            # Пост остается new и будет сгенерирован следующим запуском
+                            deferred_count += 1
+                            continue
+                        if not post_text:
+                            post.status = PostStatus.FAILED
+                            logger.warning(f'Не удалось сгенерировать пост для новости {post.news_id}')
+                            continue
+
+                        # Обновляем существующий пост
+                        post.generated_text = post_text
+                        post.status = PostStatus.GENERATED
+                        generated_count += 1
+                        logger.info(f'Сгенерирован пост для новости {post.news_id}')
+
+                # Коммит пачки снимает блокировки, взятые при выборке
+                post_ids = [post.id for post in posts]
+                session.commit()
+                invalidate_cache('posts', post_ids)
+
+                if deferred_count:
+                    logger.warning(
+                        f'OpenAI ограничивает запросы, генерация остановлена (отложено постов: {deferred_count})'
+                    )
+                    break
+
+            if not claimed:
                 logger.info('Нет новых постов для генерации')
-                return {'status': 'success', 'generated': 0}
-
-            generated_count = 0
-            for post in posts:
-                try:
-                    news_item = session.query(NewsItem).filter(NewsItem.id == post.news_id).first()
-                    if not news_item:
-                        logger.warning(f'Новость с id {post.news_id} не найдена')
-                        continue
+                return {'status': 'success', 'generated': 0, 'skipped': 0, 'deferred': 0}
 
-                    # TODO: filter existing news by keywords
-                    post_text = generate_posts(news_item)
-                    if not post_text:
-                        post.status = PostStatus.FAILED
-                        logger.warning(f'Не удалось сгенерировать пост для новости {news_item.id}')
-                        continue
-
-                    # Обновляем существующий пост
-                    post.generated_text = post_text
-                    post.status = PostStatus.GENERATED
-                    generated_count += 1
-                    logger.info(f'Сгенерирован пост для новости {news_item.id}')
-
-                except Exception as e:
-                    logger.error(f'Ошибка при генерации поста для новости {post.news_id}: {e}', exc_info=True)
-                    post.status = PostStatus.FAILED
-                    continue
-
-            session.commit()
-            logger.info(f'Генерация завершена. Сгенерировано постов: {generated_count}')
+            logger.info(
+                f'Генерация завершена. Сгенерировано постов: {generated_count}, '
+                f'пропущено по ключевым словам: {skipped_count}, отложено из-за лимитов: {deferred_count}'
+            )
 
             if generated_count > 0:
                 logger.info(f'Запускаем публикацию постов для {generated_count} новых новостей')
                 publish_posts_task.delay()
 
-            return {'status': 'success', 'generated': generated_count}
+            return {
+                'status': 'success',
+                'generated': generated_count,
+                'skipped': skipped_count,
+                'deferred': deferred_count
+            }
 
         except Exception as e:
             logger.error(f'Ошибка при генерации постов: {e}', exc_info=True)
             session.rollback()
             raise
         finally:
+            if generator is not None:
+                generator.close()
             try:
                 next(db_gen)
             except StopIteration:
@@ -150,6 +363,74 @@ def generate_posts_task(self):
         raise self.retry(exc=e, countdown=60)
 
 
+@celery_app.task(name='app.tasks.submit_generation_batch', bind=True, max_retries=3)
+def submit_generation_batch_task(self):
+    """Отправляет до BATCH_MAX_POSTS новых постов одним батчем OpenAI Batch API"""
+    logger.info('Собираем пачку постов для Batch API')
+    try:
+        db_gen = get_db_sync()
+        session = next(db_gen)
+        try:
+            # Одна выборка с блокировкой: посты остаются заблокированными до коммита вместе с батчем
+            posts = next(_iter_post_batches(session, PostStatus.NEW, settings.BATCH_MAX_POSTS), [])
+            if not posts:
+                logger.info('Нет новых постов для Batch API')
+                return {'status': 'success', 'batch_id': None, 'posts': 0, 'skipped': 0}
+
+            pending, news_by_id, skipped = _select_for_generation(session, get_keyword_matcher(session), posts)
+            batch_id = None
+            if pending:
+                batch_id = submit_batch(session, _openai_client(), pending, news_by_id).id
+            session.commit()
+            invalidate_cache('posts', [post.id for post in posts])
+            return {'status': 'success', 'batch_id': batch_id, 'posts': len(pending), 'skipped': skipped}
+        except Exception as e:
+            logger.error(f'Ошибка при отправке батча генерации: {e}', exc_info=True)
+            session.rollback()
+            raise
+        finally:
+            try:
+                next(db_gen)
+            except StopIteration:
+                pass
+
+    except Exception as e:
+        logger.error(f'Критическая ошибка при отправке батча генерации: {e}', exc_info=True)
+        raise self.retry(exc=e, countdown=60)
+
+
+@celery_app.task(name='app.tasks.poll_generation_batches', bind=True, max_retries=3)
+def poll_generation_batches_task(self):
+    """Проверяет незавершенные батчи Batch API и переносит результаты завершенных в посты"""
+    try:
+        db_gen = get_db_sync()
+        session = next(db_gen)
+        try:
+            if not session.scalar(select(GenerationBatch.id).where(GenerationBatch.applied_at.is_(None)).limit(1)):
+                return {'status': 'success', 'pending': 0, 'applied': 0, 'generated': 0, 'failed': 0}
+
+            stats, post_ids = poll_batches(session, _openai_client())
+            if post_ids:
+                invalidate_cache('posts', post_ids)
+            if stats['generated']:
+                logger.info(f'Batch API сгенерировал постов: {stats["generated"]}, запускаем публикацию')
+                publish_posts_task.delay()
+            return {'status': 'success', **stats}
+        except Exception as e:
+            logger.error(f'Ошибка при опросе батчей генерации: {e}', exc_info=True)
+            session.rollback()
+            raise
+        finally:
+            try:
+                next(db_gen)
+            except StopIteration:
+                pass
+
+    except Exception as e:
+        logger.error(f'Критическая ошибка при опросе батчей генерации: {e}', exc_info=True)
+        raise self.retry(exc=e, countdown=60)
+
+
 @celery_app.task(name='app.tasks.publish_posts', bind=True, max_retries=3)
 def publish_posts_task(self):
     logger.info('Начинаем публикацию постов')
@@ -157,42 +438,46 @@ def publish_posts_task(self):
         db_gen = get_db_sync()
         session = next(db_gen)
         try:
-            posts = session.query(Post).filter(Post.status == PostStatus.GENERATED).all()
-            if not posts:
-                logger.info('Нет новых постов для публикации')
-                return {'status': 'success', 'published': 0, 'failed': 0}
+            published = failed = claimed = 0
+            for posts in _iter_post_batches(session, PostStatus.GENERATED, settings.PUBLISH_BATCH_SIZE):
+                claimed += len(posts)
+                for post in posts:
+                    if not post.generated_text:
+                        logger.warning(f'Пост {post.id} не имеет сгенерированного текста')
+                        continue
 
-            published = failed = 0
-            for post in posts:
-                if not post.generated_text:
-                    logger.warning(f'Пост {post.id} не имеет сгенерированного текста')
-                    continue
-                
-                try:
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
                     try:
-                        success = loop.run_until_complete(publish_post(post.generated_text))
-                    finally:
-                        loop.close()
-
-                    if success:
-                        post.status = PostStatus.PUBLISHED
-                        post.published_at = datetime.now()
-                        logger.info(f'Опубликован пост {post.id}')
-                        published += 1
-                    else:
+                        loop = asyncio.new_event_loop()
+                        asyncio.set_event_loop(loop)
+                        try:
+                            success = loop.run_until_complete(publish_post(post.generated_text))
+                        finally:
+                            loop.close()
+
+                        if success:
+                            post.status = PostStatus.PUBLISHED
+                            post.published_at = datetime.now()
+                            logger.info(f'Опубликован пост {post.id}')
+                            published += 1
+                        else:
+                            post.status = PostStatus.FAILED
+                            logger.warning(f'Не удалось опубликовать пост {post.id}')
+                            failed += 1
+
+                    except Exception as e:
+                        logger.error(f'Ошибка при публикации поста {post.id}: {e}', exc_info=True)
                         post.status = PostStatus.FAILED
-                        logger.warning(f'Не удалось опубликовать пост {post.id}')
                         failed += 1
+                        continue
 
-                except Exception as e:
-                    logger.error(f'Ошибка при публикации поста {post.id}: {e}', exc_info=True)
-                    post.status = PostStatus.FAILED
-                    failed += 1
-                    continue
+                post_ids = [post.id for post in posts]
+                session.commit()
+                invalidate_cache('posts', post_ids)
+
+            if not claimed:
+                logger.info('Нет новых постов для публикации')
+                return {'status': 'success', 'published': 0, 'failed': 0}
 
-            session.commit()
             logger.info(f'Публикация завершена. Опубликовано постов: {published}. Провалено постов: {failed}')
             return {'status': 'success', 'published': published, 'failed': failed}
         except Exception as e:
@@ -208,3 +493,19 @@ def publish_posts_task(self):
     except Exception as e:
         logger.error(f'Критическая ошибка при публикации постов: {e}', exc_info=True)
         raise self.retry(exc=e, countdown=60)
+
+
+@celery_app.task(name='app.tasks.apply_retention', bind=True, max_retries=3)
+def apply_retention_task(self):
+    if not settings.RETENTION_ENABLED:
+        return {'status': 'skipped'}
+
+    logger.info('Применяем политику хранения новостей и постов')
+    try:
+        with get_sync_engine().connect() as connection:
+            result = apply_retention(connection)
+        invalidate_cache('posts')
+        return {'status': 'success', **result}
+    except Exception as e:
+        logger.error(f'Ошибка при применении политики хранения: {e}', exc_info=True)
+        raise self.retry(exc=e, countdown=300)
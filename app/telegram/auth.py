@@ -1,3 +1,4 @@
+import argparse
 import asyncio
 import logging
 
@@ -10,13 +11,13 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-async def interactive_authorize():
+async def interactive_authorize(session_name: str = settings.TELERGAM_SESSION_NAME):
     if not settings.TELERGAM_API_ID or not settings.TELERGAM_API_HASH:
         logger.error('Telegram credentials not configured. Set TELERGAM_API_ID and TELERGAM_API_HASH in .env')
         return
     
     client = TelegramClient(
-        settings.TELERGAM_SESSION_NAME,
+        session_name,
         settings.TELERGAM_API_ID,
         settings.TELERGAM_API_HASH
     )
@@ -63,5 +64,10 @@ async def interactive_authorize():
 
 
 if __name__ == '__main__':
-    asyncio.run(interactive_authorize())
+    arg_parser = argparse.ArgumentParser(description='Авторизация Telegram')
+    arg_parser.add_argument('--reader', action='store_true', help='сессия чтения каналов (TELERGAM_READER_SESSION_NAME)')
+    args = arg_parser.parse_args()
+    asyncio.run(interactive_authorize(
+        settings.TELERGAM_READER_SESSION_NAME if args.reader else settings.TELERGAM_SESSION_NAME
+    ))
 
@@ -26,7 +26,12 @@ def get_telegram_client() -> TelegramClient | None:
     return _telegram_client
 
 
-async def authorize_telegram(phone: str, code: str | None = None, password: str | None = None) -> dict:
+async def authorize_telegram(
+        phone: str,
+        code: str | None = None,
+        password: str | None = None,
+        session_name: str = settings.TELERGAM_SESSION_NAME
+) -> dict:
     if not settings.TELERGAM_API_ID or not settings.TELERGAM_API_HASH:
         return {
             'success': False,
@@ -34,7 +39,7 @@ async def authorize_telegram(phone: str, code: str | None = None, password: str
         }
     
     client = TelegramClient(
-        settings.TELERGAM_SESSION_NAME,
+        session_name,
         settings.TELERGAM_API_ID,
         settings.TELERGAM_API_HASH
     )
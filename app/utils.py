@@ -1,106 +1,348 @@
 import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from urllib.parse import urlparse
 
+from redis import RedisError
+from sqlalchemy import insert, or_, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 
-from app.database.models import Source, NewsItem, Post
-from app.database.types import SourceType
-from app.news_parser.sites import HabrParser, SiteParser
+from app.api.cache import invalidate as invalidate_cache
+from app.config import settings
+from app.database.models import Source, NewsItem, Post, generate_uuid
+from app.database.types import PostStatus, SourceType
+from app.dedup.bloom import ScalableBloomFilter, get_news_bloom, news_bloom_keys
+from app.dedup.near import NearDuplicateIndex, filter_near_duplicates, news_fingerprint
+from app.dedup.normalize import title_hash, url_hash
+from app.news_parser.sites import SiteParser, get_parser_class, to_utc_naive
+from app.news_parser.telegram import ChannelRequest, TelegramFetchResult, channel_from_source, get_telegram_reader
+from app.redis_client import get_redis
 
 logger = logging.getLogger(__name__)
 
+# Источники, которые скачиваются по HTTP парсерами из реестра app.news_parser
+SITE_SOURCE_TYPES = (SourceType.SITE, SourceType.RSS)
+
 
 def check_duplicate(session: Session, url: str = None, title: str = None) -> bool:
-    if url:
-        existing = session.query(NewsItem).filter(NewsItem.url == url).first()
-        if existing:
-            return True
-    
-    if title:
-        existing = session.query(NewsItem).filter(NewsItem.title == title).first()
-        if existing:
-            return True
-    
-    return False
+    hashes = [(url_hash(url), title_hash(title))]
+    bloom, probable = _bloom_lookup(hashes)
+    if not probable[0]:
+        return False
+    seen_urls, seen_titles = _find_existing(session, {hashes[0][0]} - {None}, {hashes[0][1]} - {None})
+    _bloom_record(bloom, hashes, probable, seen_urls, seen_titles)
+    return bool(seen_urls or seen_titles)
+
+
+def _bloom_lookup(hashes: List[tuple]) -> tuple[Optional[ScalableBloomFilter], List[bool]]:
+    """
+    Какие новости могут уже быть в БД. Если фильтр выключен или Redis недоступен,
+    вероятными считаются все и проверка целиком уходит в SQL.
+    """
+    if not settings.BLOOM_ENABLED or not hashes:
+        return None, [True] * len(hashes)
+
+    bloom = get_news_bloom()
+    item_keys = [news_bloom_keys(url_key, title_key) for url_key, title_key in hashes]
+    try:
+        found = iter(bloom.contains([key for keys in item_keys for key in keys]))
+    except RedisError as e:
+        logger.warning(f"Фильтр Блума недоступен, проверяем дубликаты в БД: {e}")
+        return None, [True] * len(hashes)
+    return bloom, [any([next(found) for _ in keys]) for keys in item_keys]
+
+
+def _bloom_record(
+        bloom: Optional[ScalableBloomFilter],
+        hashes: List[tuple],
+        probable: List[bool],
+        seen_urls: set,
+        seen_titles: set
+):
+    """Вероятное совпадение, которого не оказалось в БД, — ложное срабатывание фильтра"""
+    if bloom is None:
+        return
+    probable_hits = sum(probable)
+    false_positives = sum(
+        1 for (url_key, title_key), is_probable in zip(hashes, probable)
+        if is_probable and url_key not in seen_urls and title_key not in seen_titles
+    )
+    try:
+        bloom.record(len(hashes), probable_hits, false_positives)
+    except RedisError as e:
+        logger.warning(f"Не удалось обновить статистику фильтра Блума: {e}")
+
+
+def _find_existing(session: Session, url_hashes: set, title_hashes: set) -> tuple[set, set]:
+    """Одним запросом по уникальным индексам находит уже сохраненные хеши url и заголовков"""
+    conditions = []
+    if url_hashes:
+        conditions.append(NewsItem.url_hash.in_(url_hashes))
+    if title_hashes:
+        conditions.append(NewsItem.title_hash.in_(title_hashes))
+    if not conditions:
+        return set(), set()
+
+    rows = session.execute(select(NewsItem.url_hash, NewsItem.title_hash).where(or_(*conditions))).all()
+    return {row.url_hash for row in rows if row.url_hash}, {row.title_hash for row in rows if row.title_hash}
+
+
+def _insert_news_rows(session: Session, rows: List[Dict[str, Any]]) -> List[str]:
+    """
+    Вставляет новости одной командой и возвращает id реально вставленных строк.
+    На Postgres и SQLite конфликты уникальных индексов пропускаются (ON CONFLICT DO NOTHING),
+    так что параллельный парсер не уронит всю пачку.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert_fn = postgresql_insert if dialect == 'postgresql' else sqlite_insert
+        stmt = insert_fn(NewsItem.__table__).on_conflict_do_nothing().returning(NewsItem.__table__.c.id)
+        return list(session.scalars(stmt, rows))
+
+    session.execute(insert(NewsItem.__table__), rows)
+    return [row['id'] for row in rows]
 
 
 def save_news_items(session: Session, news_items: List[Dict[str, Any]]) -> int:
-    saved_count = 0
-    
-    for item_data in news_items:
-        if check_duplicate(session, url=item_data.get('url'), title=item_data.get('title')):
-            logger.debug(f"Пропущен дубликат: {item_data.get('title', 'Без названия')}")
-            continue
+    hashes = [(url_hash(item.get('url')), title_hash(item.get('title'))) for item in news_items]
+    # В БД проверяем только то, что фильтр Блума считает вероятно виденным
+    bloom, probable = _bloom_lookup(hashes)
+    candidates = [item_hashes for item_hashes, is_probable in zip(hashes, probable) if is_probable]
+    seen_urls, seen_titles = _find_existing(
+        session,
+        {url_key for url_key, _ in candidates if url_key},
+        {title_key for _, title_key in candidates if title_key}
+    )
+    _bloom_record(bloom, hashes, probable, seen_urls, seen_titles)
 
-        try:
-            news_item = NewsItem(
-                title=item_data['title'],
-                url=item_data.get('url'),
-                summary=item_data.get('summary', ''),
-                source=item_data.get('source', 'unknown'),
-                published_at=item_data.get('published_at', datetime.now()),
-                raw_text=item_data.get('raw_text')
-            )
-            # Сначала добавляем news_item, чтобы получить id
-            session.add(news_item)
-            session.flush()  # Получаем id для news_item
-            
-            # Теперь создаем Post с правильным news_id
-            new_post = Post(news_id=news_item.id)
-            session.add(new_post)
-            saved_count += 1
-            logger.debug(f"Добавлена новость: {item_data.get('title', 'Без названия')}")
-        except Exception as e:
-            logger.error(f"Ошибка при сохранении новости '{item_data.get('title', 'Без названия')}': {e}")
+    now = datetime.now()
+    rows = []
+    for item_data, (url_key, title_key) in zip(news_items, hashes):
+        url, title = item_data.get('url'), item_data.get('title')
+        # Дубликаты ищем и среди сохраненных, и внутри самой пачки
+        if url_key in seen_urls or title_key in seen_titles:
+            logger.debug(f"Пропущен дубликат: {title or 'Без названия'}")
             continue
+        if url_key:
+            seen_urls.add(url_key)
+        if title_key:
+            seen_titles.add(title_key)
+
+        rows.append({
+            # id генерируем на клиенте, чтобы не делать flush ради news_id у Post
+            'id': generate_uuid(),
+            'title': title,
+            'url': url,
+            'url_hash': url_key,
+            'title_hash': title_key,
+            'summary': item_data.get('summary', ''),
+            'source': item_data.get('source', 'unknown'),
+            'published_at': item_data.get('published_at', now),
+            'raw_text': item_data.get('raw_text'),
+            'created_at': now,
+        })
+
+    fingerprints = {}
+    near_index = None
+    if settings.NEAR_DUP_ENABLED and rows:
+        near_index = NearDuplicateIndex(get_redis())
+        row_fingerprints = [news_fingerprint(row['title'], row['summary']) for row in rows]
+        duplicates = filter_near_duplicates(near_index, row_fingerprints)
+        unique_rows = []
+        for row, fingerprint, is_duplicate in zip(rows, row_fingerprints, duplicates):
+            if is_duplicate:
+                logger.debug(f"Пропущен почти-дубликат: {row['title']}")
+                continue
+            fingerprints[row['id']] = fingerprint
+            unique_rows.append(row)
+        rows = unique_rows
+
+    if not rows:
+        logger.info(f"Сохранено новостей: 0 из {len(news_items)}")
+        return 0
 
     try:
+        news_ids = _insert_news_rows(session, rows)
+        if news_ids:
+            session.execute(insert(Post.__table__), [
+                {'id': generate_uuid(), 'news_id': news_id, 'status': PostStatus.NEW, 'created_at': now}
+                for news_id in news_ids
+            ])
         session.commit()
-        logger.info(f"Сохранено новостей: {saved_count} из {len(news_items)}")
+        logger.info(f"Сохранено новостей: {len(news_ids)} из {len(news_items)}")
+        if news_ids:
+            # Новые посты появляются в списках API
+            invalidate_cache('posts')
     except Exception as e:
         session.rollback()
         logger.error(f"Ошибка при коммите транзакции: {e}")
         raise
-    
-    return saved_count
+
+    if near_index is not None and news_ids:
+        try:
+            near_index.add((fingerprints[news_id], news_id) for news_id in news_ids)
+        except RedisError as e:
+            logger.warning(f"Не удалось обновить индекс почти-дубликатов: {e}")
+
+    if settings.BLOOM_ENABLED and news_ids:
+        rows_by_id = {row['id']: row for row in rows}
+        try:
+            get_news_bloom().add([
+                key for news_id in news_ids
+                for key in news_bloom_keys(rows_by_id[news_id]['url_hash'], rows_by_id[news_id]['title_hash'])
+            ])
+        except RedisError as e:
+            # Пропущенные в фильтре новости не станут дублями: их отсечет уникальный индекс при вставке
+            logger.warning(f"Не удалось обновить фильтр Блума: {e}")
+
+    return len(news_ids)
+
+
+def get_site_parser(source: Source) -> SiteParser | None:
+    parser_cls = get_parser_class(source)
+    if not parser_cls:
+        return None
+    return parser_cls.from_source(source)
+
+
+def _host_of(source: Source) -> str:
+    return urlparse(source.url or '').hostname or source.name or ''
+
+
+@dataclass
+class SiteFetchResult:
+    # None — страница не изменилась с прошлого запроса (304)
+    news_items: Optional[List[Dict[str, Any]]]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+def fetch_site_sources(
+        sources: List[Source],
+        max_workers: int | None = None,
+        per_host_limit: int | None = None
+) -> Dict[str, SiteFetchResult | Exception]:
+    """
+    Параллельно скачивает и разбирает страницы сайтов-источников.
+    Возвращает словарь source.id -> SiteFetchResult (или исключение);
+    источники без парсера в словарь не попадают.
+    В БД ничего не пишет: сохранение выполняется отдельно, в одной сессии.
+    """
+    max_workers = max_workers or settings.PARSE_MAX_WORKERS
+    per_host_limit = per_host_limit or settings.PARSE_PER_HOST_LIMIT
+
+    # Парсеры и хосты подготавливаем в основном потоке, чтобы потоки не трогали ORM-объекты
+    jobs = []
+    results: Dict[str, SiteFetchResult | Exception] = {}
+    for source in sources:
+        # Ошибка настройки одного источника (например, неполные селекторы) не должна срывать парсинг остальных
+        try:
+            parser = get_site_parser(source)
+        except Exception as e:
+            logger.error(f"Не удалось создать парсер для источника '{source.name}': {e}")
+            results[source.id] = e
+            continue
+        if not parser:
+            logger.warning(f"Парсер для источника '{source.name}' не найден")
+            continue
+        jobs.append((source.id, source.name, _host_of(source), parser))
+
+    if not jobs:
+        return results
+
+    host_limits: Dict[str, threading.BoundedSemaphore] = {}
+    for _, _, host, _ in jobs:
+        host_limits.setdefault(host, threading.BoundedSemaphore(per_host_limit))
+
+    def fetch(source_name: str, host: str, parser: SiteParser) -> SiteFetchResult:
+        with host_limits[host]:
+            logger.info(f"Парсинг новостей с источника: {source_name}")
+            news_items = parser.parse()
+            return SiteFetchResult(news_items, etag=parser.etag, last_modified=parser.last_modified)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs)), thread_name_prefix='parse') as executor:
+        futures = {
+            executor.submit(fetch, source_name, host, parser): (source_id, source_name)
+            for source_id, source_name, host, parser in jobs
+        }
+        for future in as_completed(futures):
+            source_id, source_name = futures[future]
+            try:
+                results[source_id] = future.result()
+            except Exception as e:
+                logger.error(f"Ошибка при парсинге источника '{source_name}': {e}", exc_info=True)
+                results[source_id] = e
+
+    return results
+
+
+def store_site_fetch_result(session: Session, source: Source, result: SiteFetchResult) -> int:
+    source_name = source.name
+    if result.news_items is None:
+        logger.info(f"Источник '{source_name}' не изменился с прошлого парсинга")
+        return 0
+
+    saved = store_source_news(session, source_name, result.news_items)
+
+    # Курсор и валидаторы сдвигаем только после успешного сохранения новостей
+    cursor = max(
+        (to_utc_naive(item['published_at']) for item in result.news_items if item.get('published_at')),
+        default=None
+    )
+    changed = False
+    if cursor and (source.cursor_published_at is None or cursor > source.cursor_published_at):
+        source.cursor_published_at = cursor
+        changed = True
+    if (source.http_etag, source.http_last_modified) != (result.etag, result.last_modified):
+        source.http_etag = result.etag
+        source.http_last_modified = result.last_modified
+        changed = True
+    if changed:
+        session.commit()
+    return saved
+
+
+def store_source_news(session: Session, source_name: str, news_items: List[Dict[str, Any]]) -> int:
+    if not news_items:
+        logger.warning(f"Не найдено новостей с источника: {source_name}")
+        return 0
+
+    # Фильтруем новости без title
+    valid_news_items = [item for item in news_items if item.get('title')]
+    if len(valid_news_items) < len(news_items):
+        logger.warning(f"Отфильтровано {len(news_items) - len(valid_news_items)} новостей без заголовка")
+
+    if not valid_news_items:
+        logger.warning(f"Все новости с источника '{source_name}' не имеют заголовка")
+        return 0
+
+    saved = save_news_items(session, valid_news_items)
+    logger.info(f"Источник '{source_name}': сохранено {saved} новостей")
+    return saved
 
 
 def parse_site_source(session: Session, source: Source) -> int:
-    if source.type != SourceType.SITE or not source.enabled:
+    if source.type not in SITE_SOURCE_TYPES or not source.enabled:
         return 0
     
     # Сохраняем имя источника до обработки
     source_name = source.name
-    source_url = source.url
     
     try:
-        parser: SiteParser
-        if 'habr' in source_name.lower() or 'habr' in (source_url or '').lower():
-            parser = HabrParser()
-        else:
+        parser = get_site_parser(source)
+        if not parser:
             logger.warning(f"Парсер для источника '{source_name}' не найден")
             return 0
         
         logger.info(f"Парсинг новостей с источника: {source_name}")
         news_items = parser.parse()
-        
-        if not news_items:
-            logger.warning(f"Не найдено новостей с источника: {source_name}")
-            return 0
-        
-        # Фильтруем новости без title
-        valid_news_items = [item for item in news_items if item.get('title')]
-        if len(valid_news_items) < len(news_items):
-            logger.warning(f"Отфильтровано {len(news_items) - len(valid_news_items)} новостей без заголовка")
-        
-        if not valid_news_items:
-            logger.warning(f"Все новости с источника '{source_name}' не имеют заголовка")
-            return 0
-        
-        saved = save_news_items(session, valid_news_items)
-        logger.info(f"Источник '{source_name}': сохранено {saved} новостей")
-        return saved
+        result = SiteFetchResult(news_items, etag=parser.etag, last_modified=parser.last_modified)
+        return store_site_fetch_result(session, source, result)
         
     except Exception as e:
         logger.error(f"Ошибка при парсинге источника '{source_name}': {e}", exc_info=True)
@@ -108,11 +350,61 @@ def parse_site_source(session: Session, source: Source) -> int:
         return 0
 
 
+def fetch_telegram_sources(sources: List[Source]) -> Future:
+    """
+    Запускает чтение Telegram-каналов в фоне (одно подключение на процесс),
+    чтобы оно шло одновременно с загрузкой сайтов. Результат забирается collect_telegram_results.
+    """
+    requests = [
+        ChannelRequest(
+            source_id=source.id,
+            source_name=source.name,
+            channel=channel_from_source(source.url, source.name),
+            min_id=source.cursor_message_id
+        )
+        for source in sources
+    ]
+    if not requests:
+        future = Future()
+        future.set_result({})
+        return future
+    return get_telegram_reader().submit(requests)
+
+
+def collect_telegram_results(future: Future, sources: List[Source]) -> Dict[str, TelegramFetchResult | Exception]:
+    try:
+        return future.result(timeout=settings.TG_FETCH_TIMEOUT)
+    except TimeoutError as e:
+        # Курсоры не сдвигаем, поэтому чтение нужно остановить: иначе оно пересечется со следующим запуском
+        future.cancel()
+        logger.error(f"Чтение Telegram-каналов не уложилось в {settings.TG_FETCH_TIMEOUT} с и отменено")
+        return {source.id: e for source in sources}
+    except Exception as e:
+        logger.error(f"Ошибка при чтении Telegram-каналов: {e}", exc_info=True)
+        return {source.id: e for source in sources}
+
+
+def store_telegram_fetch_result(session: Session, source: Source, result: TelegramFetchResult) -> int:
+    saved = store_source_news(session, source.name, result.news_items) if result.news_items else 0
+    if result.max_id and result.max_id != source.cursor_message_id:
+        source.cursor_message_id = result.max_id
+        session.commit()
+    return saved
+
+
 def parse_telegram_source(session: Session, source: Source) -> int:
     if source.type != SourceType.TG or not source.enabled:
         return 0
-    
-    # TODO: Реализовать парсинг Telegram-каналов
-    logger.warning(f"Парсинг Telegram-каналов еще не реализован для источника: {source.name}")
-    return 0
 
+    source_name = source.name
+    results = collect_telegram_results(fetch_telegram_sources([source]), [source])
+    result = results.get(source.id)
+    if isinstance(result, Exception):
+        return 0
+
+    try:
+        return store_telegram_fetch_result(session, source, result)
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении новостей источника '{source_name}': {e}", exc_info=True)
+        session.rollback()
+        return 0
@@ -2,6 +2,7 @@ import platform
 from datetime import timedelta
 
 from celery import Celery
+from celery.signals import worker_process_init
 
 from app.config import settings
 
@@ -21,12 +22,24 @@ celery_app.conf.update(
         'app.tasks.parse_news': {
             'queue': 'parsing',
         },
+        'app.tasks.enrich_news': {
+            'queue': 'enrichment',
+        },
         'app.tasks.generate_posts': {
             'queue': 'generation',
         },
+        'app.tasks.submit_generation_batch': {
+            'queue': 'generation',
+        },
+        'app.tasks.poll_generation_batches': {
+            'queue': 'generation',
+        },
         'app.tasks.publish_posts': {
             'queue': 'publish',
         },
+        'app.tasks.apply_retention': {
+            'queue': 'maintenance',
+        },
     },
     task_acks_late=True,
     task_time_limit=300,  # 5 минут для генерации
@@ -43,12 +56,28 @@ celery_app.conf.update(
             'task': 'app.tasks.generate_posts',
             'schedule': timedelta(minutes=settings.GENERATE_INTERVAL_MINUTES),
         },
+        'poll_generation_batches': {
+            'task': 'app.tasks.poll_generation_batches',
+            'schedule': timedelta(minutes=settings.BATCH_POLL_INTERVAL_MINUTES),
+        },
         'publish_posts': {
             'task': 'app.tasks.publish_posts',
             'schedule': timedelta(minutes=settings.PUBLISH_INTERVAL_MINUTES),
+        },
+        'apply_retention': {
+            'task': 'app.tasks.apply_retention',
+            'schedule': timedelta(hours=settings.RETENTION_INTERVAL_HOURS),
         }
     }
 )
 
+
+@worker_process_init.connect
+def reset_db_engines(**kwargs):
+    # Дочерний процесс prefork не должен пользоваться соединениями, открытыми в родителе
+    from app.database.db import dispose_engines
+    dispose_engines()
+
+
 if __name__ == '__main__':
     celery_app.start()
@@ -0,0 +1,34 @@
+from sqlalchemy import create_engine, insert, select
+
+from app.database.migrate import backfill_news_hashes
+from app.database.models import Base, NewsItem
+
+
+def test_backfill_news_hashes_is_idempotent(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "news.db"}')
+    Base.metadata.create_all(engine)
+    news = NewsItem.__table__
+
+    with engine.begin() as conn:
+        conn.execute(insert(news), [
+            {'id': '1', 'title': 'Первая новость', 'url': 'https://example.com/a', 'summary': '', 'source': 's'},
+            # Дубликат url: url_hash должен остаться пустым, title_hash — заполниться
+            {'id': '2', 'title': 'Вторая новость', 'url': 'https://example.com/a?utm_source=x', 'summary': '', 'source': 's'},
+            # Заголовок из одних знаков препинания нормализуется в пустую строку
+            {'id': '3', 'title': '!!!', 'url': 'https://example.com/c', 'summary': '', 'source': 's'},
+        ])
+
+    def hashes():
+        with engine.connect() as conn:
+            return {row.id: (row.url_hash, row.title_hash) for row in conn.execute(select(news))}
+
+    with engine.connect() as conn:
+        backfill_news_hashes(conn)
+    first = hashes()
+
+    assert first['1'][0] and first['1'][1]
+    assert first['2'][0] is None and first['2'][1]
+
+    with engine.connect() as conn:
+        backfill_news_hashes(conn)
+    assert hashes() == first
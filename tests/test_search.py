@@ -0,0 +1,23 @@
+from sqlalchemy import create_engine, delete, insert
+
+from app.database.migrate import sync_schema
+from app.database.models import NewsItem
+from app.database.search import search_news_query, vacuum_sqlite
+
+
+def test_search_after_vacuum(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "news.db"}')
+    with engine.begin() as conn:
+        sync_schema(conn)
+        conn.execute(insert(NewsItem.__table__), [
+            {'id': f'n{i}', 'title': f'Новость {i} про {word}', 'url': f'https://example.com/{i}', 'summary': '',
+             'source': 's'}
+            for i, word in enumerate(['выборы', 'погоду', 'футбол', 'погоду', 'выборы'])
+        ])
+        conn.execute(delete(NewsItem.__table__).where(NewsItem.id.in_(['n0', 'n1'])))
+
+    vacuum_sqlite(engine)
+
+    with engine.connect() as conn:
+        found = [row.id for row in conn.execute(search_news_query('sqlite', 'погоду'))]
+    assert found == ['n3']
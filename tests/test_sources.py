@@ -0,0 +1,25 @@
+import pytest
+from pydantic import ValidationError
+
+from app.api.schemas import SourceCreate
+from app.database.models import Source
+from app.database.types import SourceType
+from app.utils import fetch_site_sources
+
+
+def test_selectors_parser_requires_selectors():
+    with pytest.raises(ValidationError):
+        SourceCreate(type='site', name='x', url='https://x.com', parser='selectors')
+    with pytest.raises(ValidationError):
+        SourceCreate(type='site', name='x', url='https://x.com', parser='selectors', selectors={'list': 'article'})
+    SourceCreate(type='site', name='x', url='https://x.com', parser='selectors', selectors={'list': 'a', 'title': 'h2'})
+
+
+def test_misconfigured_source_does_not_abort_others():
+    broken = Source(id='1', type=SourceType.SITE, name='broken', url='https://x.com', parser='selectors')
+    unknown = Source(id='2', type=SourceType.SITE, name='unknown', url='https://unknown.example')
+
+    results = fetch_site_sources([broken, unknown])
+
+    assert isinstance(results['1'], ValueError)
+    assert '2' not in results